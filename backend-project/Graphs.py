@@ -48,6 +48,12 @@ class CausalGraph:
         Maps node names to the node objects.
     edges : dict[str, list(CausalEdge)]
         Maps node names to a list of edges from and to the node.
+    incoming : dict[str, dict[str, CausalEdge]]
+        Maps node names to a dictionary that maps the names of the
+        parent nodes to the incoming edges of the node.
+    node_position : dict[str, int]
+        Maps node names to the order in which the nodes were first
+        added to the graph.
 
     Methods
     -------
@@ -59,8 +65,24 @@ class CausalGraph:
         """
         self.nodes: dict[str, CausalNode] = {}
         self.edges: dict[str, dict[str, CausalEdge]] = {}
+        self.incoming: dict[str, dict[str, CausalEdge]] = {}
+        self.node_position: dict[str, int] = {}
         self.parent: GroupedCausalNode = parent
 
+    def __setstate__(self, state):
+        """
+        Restore a pickled CausalGraph, rebuilding the incoming edges
+        and the node positions if they were not pickled.
+        """
+        self.__dict__.update(state)
+        if "incoming" not in state:
+            self.incoming = {name: {} for name in self.nodes}
+            for from_name, edge_dict in self.edges.items():
+                for to_name, edge in edge_dict.items():
+                    self.incoming.setdefault(to_name, {})[from_name] = edge
+        if "node_position" not in state:
+            self.node_position = {name: i for i, name in enumerate(self.nodes)}
+
     def add_node(self, node: str or CausalNode, dynamic=True):
         """
         Add a node to this CausalGraph.
@@ -79,8 +101,21 @@ class CausalGraph:
         if isinstance(node, str):
             self.add_node(CausalNode(name=node, graph=self))
         elif isinstance(node, CausalNode):
+            # re-adding a node removes its outgoing edges
+            for to_name in self.edges.get(node.name, {}):
+                self.incoming[to_name].pop(node.name, None)
+
             self.nodes[node.name] = node
             self.edges[node.name] = {}
+            self.incoming.setdefault(node.name, {})
+            # a re-added node keeps its place in self.nodes
+            self.node_position.setdefault(node.name, len(self.node_position))
+
+            # register the node in the variable index of the grouped graph
+            grouped_graph = getattr(self.parent, "parent", None)
+            if isinstance(grouped_graph, GroupedCausalGraph):
+                grouped_graph.indexVariable(node.name, self.parent)
+                grouped_graph.invalidatePlans()
         else:
             raise ValueError(
                 'node argument must be of type string or GroupedCausalNode')
@@ -129,6 +164,8 @@ class CausalGraph:
             raise ValueError('nodes do not exist in graph')
         else:
             self.edges[from_node.name][to_node.name] = edge
+            self.incoming[to_node.name][from_node.name] = edge
+            self.parent.parent.invalidatePlans()
 
     def getOutgoingEdges(self, node: CausalNode):
         """
@@ -148,15 +185,14 @@ class CausalGraph:
         Returns
         -------
         out : list[CausalEdge]
-            List of incoming edges for node
+            List of incoming edges for node, in the order in which
+            the parent nodes were added to the graph
         """
-        incoming_edges = []
-
-        for from_node in self.getNodes():
-            if self.edgeExists(from_node=from_node, to_node=node):
-                incoming_edges.append(self.edges[from_node.name][node.name])
+        incoming_edges = self.incoming.get(node.name, {})
+        if len(incoming_edges) < 2:
+            return list(incoming_edges.values())
 
-        return incoming_edges
+        return [incoming_edges[name] for name in sorted(incoming_edges, key=self.node_position.__getitem__)]
 
     def getParents(self, node: CausalNode):
         """
@@ -412,6 +448,45 @@ class S2SGroupedCausalEdge:
         return self.from_node.name + " ----> " + self.to_node.name + "    (static -> static)"
 
 
+class ConditioningPlan:
+    """
+    The variables to condition on when estimating the causal effect of a
+    variable, compiled from a GroupedCausalGraph.
+
+    Attributes
+    ----------
+    variable : str
+        Name of the variable.
+    static_parents : list of str
+        Names of the static parents of the variable.
+    dynamic_parents : list of str
+        Names of the temporal copies (e.g. "X_tm1") of the dynamic parents
+        of the variable.
+    markov_order : int
+        Largest time lag among the temporal copies, 0 if there are none.
+    version : int
+        Version of the GroupedCausalGraph the plan was compiled from.
+    """
+
+    def __init__(self, variable: str, static_parents: list, dynamic_parents: list,
+                 markov_order: int, version: int):
+        """
+        Create a ConditioningPlan.
+        """
+        self.variable = variable
+        self.static_parents = static_parents
+        self.dynamic_parents = dynamic_parents
+        self.markov_order = markov_order
+        self.version = version
+
+    def __repr__(self):
+        """
+        Compute string representation of this ConditioningPlan.
+        """
+        return self.variable + " | static: " + str(self.static_parents) + \
+            ", dynamic: " + str(self.dynamic_parents)
+
+
 class GroupedCausalGraph:
     """
     Represent a grouped causal graph.
@@ -424,6 +499,22 @@ class GroupedCausalGraph:
         to a dictionary containing the edges in which the node
         is involved. The dictionary maps names of other nodes
         to GroupedCausalEdge objects.
+    incoming : dict[str, dict[str, GroupedCausalEdge]]
+        Maps each name of a GroupedCausalNode to a dictionary
+        that maps the names of its parent nodes to the incoming
+        edges of the node.
+    node_position : dict[str, int]
+        Maps the name of each GroupedCausalNode to the order in
+        which the nodes were first added to the graph.
+    variable_index : dict[str, GroupedCausalNode]
+        Maps the name of each variable (CausalNode) in the
+        flattened graph to the group it belongs to.
+    version : int
+        Incremented whenever a node or edge is added to this graph
+        or to the graph of one of its groups.
+    plans : dict[str, ConditioningPlan]
+        Maps the name of each variable to its conditioning plan,
+        compiled from version plans_version of this graph.
     """
 
     def __init__(self):
@@ -432,7 +523,37 @@ class GroupedCausalGraph:
         """
         self.nodes: dict[str, GroupedCausalNode] = {}
         self.edges: dict[str, dict[str, GroupedCausalEdge]] = {}
+        self.incoming: dict[str, dict[str, GroupedCausalEdge]] = {}
+        self.node_position: dict[str, int] = {}
+        self.variable_index: dict[str, GroupedCausalNode] = {}
         self.max_time_to_effect = -np.Inf
+        self.version = 0
+        self.plans: dict[str, ConditioningPlan] = {}
+        self.plans_version = None
+
+    def __setstate__(self, state):
+        """
+        Restore a pickled GroupedCausalGraph, rebuilding the incoming
+        edges, the node positions and the variable index if they were
+        not pickled.
+        """
+        self.__dict__.update(state)
+        if "incoming" not in state:
+            self.incoming = {name: {} for name in self.nodes}
+            for from_name, edge_dict in self.edges.items():
+                for to_name, edge in edge_dict.items():
+                    self.incoming.setdefault(to_name, {})[from_name] = edge
+        if "node_position" not in state:
+            self.node_position = {name: i for i, name in enumerate(self.nodes)}
+        if "variable_index" not in state:
+            self.variable_index = {}
+            for group in self.nodes.values():
+                for variable_name in group.graph.nodes:
+                    self.variable_index.setdefault(variable_name, group)
+        if "version" not in state:
+            self.version = 0
+            self.plans = {}
+            self.plans_version = None
 
     def add_node(self, node: str or GroupedCausalNode, dynamic=True):
         """
@@ -453,8 +574,19 @@ class GroupedCausalGraph:
             self.add_node(GroupedCausalNode(
                 name=node, parent=self, dynamic=dynamic))
         elif isinstance(node, GroupedCausalNode):
+            # re-adding a node removes its outgoing edges
+            for to_name in self.edges.get(node.name, {}):
+                self.incoming[to_name].pop(node.name, None)
+
             self.nodes[node.name] = node
             self.edges[node.name] = {}
+            self.incoming.setdefault(node.name, {})
+            # a re-added node keeps its place in self.nodes
+            self.node_position.setdefault(node.name, len(self.node_position))
+
+            for variable_name in node.graph.nodes:
+                self.indexVariable(variable_name, node)
+            self.invalidatePlans()
         else:
             raise ValueError(
                 'node argument must be of type string or GroupedCausalNode')
@@ -492,15 +624,14 @@ class GroupedCausalGraph:
         Returns
         -------
         out : list[GroupedCausalEdge]
-            List of incoming edges for this grouped causal node
+            List of incoming edges for this grouped causal node, in the
+            order in which the parent nodes were added to the graph
         """
-        incoming_edges = []
+        incoming_edges = self.incoming.get(node.name, {})
+        if len(incoming_edges) < 2:
+            return list(incoming_edges.values())
 
-        for from_node in self.getNodes():
-            if self.getEdge(from_node=from_node, to_node=node):
-                incoming_edges.append(self.edges[from_node.name][node.name])
-
-        return incoming_edges
+        return [incoming_edges[name] for name in sorted(incoming_edges, key=self.node_position.__getitem__)]
 
     def getNodes(self):
         """
@@ -566,6 +697,8 @@ class GroupedCausalGraph:
             raise ValueError('nodes do not exist in grouped graph')
         else:
             self.edges[from_node.name][to_node.name] = edge
+            self.incoming[to_node.name][from_node.name] = edge
+            self.invalidatePlans()
 
     def getNode(self, node: str or GroupedCausalNode):
         """
@@ -580,24 +713,52 @@ class GroupedCausalGraph:
             else:
                 return False
 
+    def indexVariable(self, variable_name: str, group: GroupedCausalNode):
+        """
+        Record that the variable variable_name belongs to group. If the
+        variable already belongs to another group of this graph, keep
+        the group that was added first.
+        """
+        indexed_group = self.variable_index.get(variable_name)
+        if (indexed_group is None) or (indexed_group is group) or \
+                (self.nodes.get(indexed_group.name) is not indexed_group) or \
+                (variable_name not in indexed_group.graph.nodes):
+            self.variable_index[variable_name] = group
+
     def getFlattenedNode(self, variable_name: str):
         """
         Return the CausalNode in the flattened graph with name variable_name.
         """
-        for grouped_node in self.nodes.values():
-            node = grouped_node.graph.getNode(variable_name)
-            if node:
-                return node
+        group = self.getVariableGroup(variable_name)
+        if group:
+            return group.graph.nodes[variable_name]
         # if node could not be found, return false
         return False
 
+    def getVariableGroup(self, variable_name: str):
+        """
+        Return the GroupedCausalNode that contains the variable variable_name,
+        or None if there is no such group.
+        """
+        group = self.variable_index.get(variable_name)
+        if (group is not None) and (self.nodes.get(group.name) is group) and \
+                (variable_name in group.graph.nodes):
+            return group
+
+        # the index is out of date (e.g. a group's graph was replaced
+        # directly), so search all groups and update the index
+        for group in self.nodes.values():
+            if variable_name in group.graph.nodes:
+                self.variable_index[variable_name] = group
+                return group
+        self.variable_index.pop(variable_name, None)
+        return None
+
     def getGroup(self, node: CausalNode):
         """
         Return the GroupedCausalNode to which node belongs.
         """
-        for group_name in self.nodes:
-            if (node.name in self.nodes[group_name].graph.nodes):
-                return self.nodes[group_name]
+        return self.getVariableGroup(node.name)
 
     def getParents(self, node: GroupedCausalNode or CausalNode):
         """
@@ -669,22 +830,21 @@ class GroupedCausalGraph:
 
         return (static_nodes, dynamic_nodes)
 
-    def getTemporalCopiesOfParent(self, parent_node: CausalNode, effect_node: CausalNode):
+    def getVariableNames(self):
         """
-        Compute list of temporal copies of a parent node acting on an effect node.
+        Return the names of all variables (CausalNode's) in the flattened graph.
+        """
+        return [node.name for group in self.nodes.values() for node in group.graph.nodes.values()]
 
-        For example, if parent_node -1,2-> effect_node and parent_node.name is "Parent",
-        then getTemporalCopiesOfParent(parent_node, effect_node) returns the list 
-        ["Parent_tm1", "Parent_tm2"].
+    def getTimeToEffectOfParent(self, parent_node: CausalNode, effect_node: CausalNode):
+        """
+        Return the time-to-effect (dict with keys 'min' and 'max') with which
+        the dynamic node parent_node acts on effect_node.
         """
         if (parent_node.graph.parent is effect_node.graph.parent):
-            print(parent_node.graph.parent)
-            print(effect_node.graph.parent)
             edge = parent_node.graph.getEdge(parent_node, effect_node)
             if edge:
-                time_to_effect = getTimeToEffect(edge)
-                return [parent_node.name + "_tm" + str(i) for i in
-                        range(time_to_effect['min'], time_to_effect['max']+1)]
+                return edge.getTimeToEffect()
             else:
                 raise Exception("no edge exists between the two nodes!")
         else:
@@ -693,15 +853,97 @@ class GroupedCausalGraph:
                                 effect_node.graph.parent)
             if edge:
                 if isinstance(edge, D2DGroupedCausalEdge):
-                    time_to_effect = edge.time_to_effect
-                    return [parent_node.name + "_tm" + str(i) for i in
-                            range(time_to_effect['min'], time_to_effect['max']+1)]
+                    return edge.time_to_effect
                 else:
                     raise Exception(
                         "edge between groups is not a dynamic-to-dynamic edge!")
             else:
                 raise Exception("edge between groups does not exist!")
 
+    def getTemporalCopiesOfParent(self, parent_node: CausalNode, effect_node: CausalNode):
+        """
+        Compute list of temporal copies of a parent node acting on an effect node.
+
+        For example, if parent_node -1,2-> effect_node and parent_node.name is "Parent",
+        then getTemporalCopiesOfParent(parent_node, effect_node) returns the list 
+        ["Parent_tm1", "Parent_tm2"].
+        """
+        time_to_effect = self.getTimeToEffectOfParent(parent_node, effect_node)
+        return [parent_node.name + "_tm" + str(i) for i in
+                range(time_to_effect['min'], time_to_effect['max']+1)]
+
+    def invalidatePlans(self):
+        """
+        Mark the compiled conditioning plans as out of date. Called whenever
+        this graph or the graph of one of its groups is edited.
+        """
+        self.version += 1
+
+    def compile(self):
+        """
+        Compile the conditioning plan of every variable in the flattened graph.
+
+        Plans that cannot be compiled (e.g. because a time-to-effect is
+        missing) are stored as the exception that was raised, which is raised
+        again when the plan is requested with getConditioningPlan.
+
+        Returns
+        -------
+        out : dict[str, ConditioningPlan]
+            Maps the name of each variable to its conditioning plan.
+        """
+        plans = {}
+        for group in self.nodes.values():
+            for node in group.graph.nodes.values():
+                try:
+                    plans[node.name] = self.compilePlan(node)
+                except Exception as error:
+                    plans[node.name] = error
+
+        self.plans = plans
+        self.plans_version = self.version
+        return plans
+
+    def compilePlan(self, node: CausalNode):
+        """
+        Compute the conditioning plan of a CausalNode: its static parents and
+        the temporal copies of its dynamic parents.
+        """
+        parent_nodes = self.getParents(node)
+        static_parents = [parent.name for parent in parent_nodes if parent.isStatic()]
+
+        # create the temporal copies, for example X_tm1, X_tm2, X_tm3... for node X
+        dynamic_parents = []
+        markov_order = 0
+        for parent in parent_nodes:
+            if parent.isDynamic():
+                time_to_effect = self.getTimeToEffectOfParent(parent_node=parent, effect_node=node)
+                dynamic_parents += [parent.name + "_tm" + str(i) for i in
+                                    range(time_to_effect['min'], time_to_effect['max']+1)]
+                markov_order = max(markov_order, time_to_effect['max'])
+
+        return ConditioningPlan(variable=node.name, static_parents=static_parents,
+                                dynamic_parents=dynamic_parents, markov_order=markov_order,
+                                version=self.version)
+
+    def getConditioningPlan(self, variable_name: str):
+        """
+        Return the ConditioningPlan of the variable variable_name, compiling the
+        plans first if the graph was edited since they were last compiled.
+
+        Returns
+        -------
+        out : ConditioningPlan | None
+            The plan, or None if the graph has no variable variable_name.
+        """
+        if self.plans_version != self.version:
+            self.compile()
+
+        plan = self.plans.get(variable_name)
+        if isinstance(plan, Exception):
+            raise plan
+        return plan
+
     def __repr__(self):
         """
         Compute string representation of this GroupedCausalGraph.
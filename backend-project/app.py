@@ -1,21 +1,31 @@
-from ast import Call
-from fastapi import FastAPI, UploadFile, File, HTTPException, Body
+from fastapi import FastAPI, UploadFile, HTTPException, Body, Header, Request
 from fastapi.middleware.cors import CORSMiddleware
-import pandas as pd
+from fastapi.responses import Response, StreamingResponse
+from prometheus_client import REGISTRY, CONTENT_TYPE_LATEST, generate_latest
+from starlette.concurrency import run_in_threadpool
 import os
 import aiofiles
-import json
-import pickle
 import numpy as np
 
-import pydantic
-import random
+import hashlib
+import asyncio
+import logging
+from contextlib import nullcontext
+from contextvars import copy_context
 
-from sklearn.ensemble import RandomForestRegressor
 from causal_inference import compute_causal_effect
+from data_store import convert_upload, open_dataset, dataset_hash, check_required_columns, csv_header, \
+    detect_format_from_bytes
+from caching import DatasetCache, GraphCache, ResultCache, FittedModelStore, hash_graph, hash_model
+from graph_store import write_graph
+from estimators import ESTIMATORS, DEFAULT_ESTIMATOR, make_estimator
+from jobs import JobManager
+from result_encoding import NumpyJSONResponse, dumps_json, result_to_json, result_response
+from tracing import start_trace, current_trace, profiled
+from metrics import observe_stage, CacheCollector, REQUESTS, ERRORS, ESTIMATIONS_IN_FLIGHT, \
+    ACTIVE_JOBS, DATASET_ROWS, DATASET_BYTES
 from Graphs import GroupedCausalGraph
 from parseGraph import parseGroupedGraph
-from typing import Callable, Type
 from pydantic import BaseModel
 
 app = FastAPI()
@@ -27,14 +37,123 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["Server-Timing", "X-Profile"],
 )
 
 
+# level of the log messages of the backend (DEBUG also logs every result)
+LOG_LEVEL = os.environ.get("LOG_LEVEL", "INFO")
+
 ROOT = "./data/"
-DATA_DESTINATION = ROOT + "user_data.csv"
-GRAPH_FILENAME = "grouped_graph.pickle"
+UPLOAD_DESTINATION = ROOT + "upload.tmp"
+UPLOAD_CHUNK_SIZE = 1 << 20
+DATA_DESTINATION = ROOT + "user_data.arrow"
+GRAPH_FILENAME = "grouped_graph.json"
 GRAPH_DESTINATION = ROOT + GRAPH_FILENAME
 
+RESULT_CACHE_SIZE = 64
+RESULT_CACHE_MAX_AGE = 60 * 60  # seconds
+RESULT_CACHE_SPILL_DIR = ROOT + "result_cache/"
+
+MODEL_STORE_MAX_BYTES = 1 << 30
+
+# number of patients sampled for approximate results
+APPROXIMATE_N_PATIENTS = 200
+
+# maximum number of bootstrap replicates for confidence bands
+BOOTSTRAP_MAX_REPLICATES = 500
+
+# seed for sampling patients and bootstrap replicates, fixed so that
+# cached results are reproducible
+RANDOM_STATE = 0
+
+# largest number of threads or processes a request may use (n_jobs=-1
+# uses this many)
+N_JOBS_MAX = os.cpu_count() or 1
+
+JOB_WORKERS = 2
+JOB_MAX_AGE = 60 * 60  # seconds
+
+# cProfile dumps of requests made with profile=true
+PROFILE_DIR = ROOT + "profiles/"
+
+logging.basicConfig(level=LOG_LEVEL, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+logger = logging.getLogger(__name__)
+
+# parsed copy of the uploaded data, replaced on every new upload
+dataset_cache = DatasetCache()
+
+# parsed copy of the causal graph, replaced whenever a new graph is sent
+graph_cache = GraphCache()
+
+# causal effect results of previous requests
+result_cache = ResultCache(max_entries=RESULT_CACHE_SIZE,
+                           max_age=RESULT_CACHE_MAX_AGE,
+                           spill_dir=RESULT_CACHE_SPILL_DIR)
+
+# fitted regression models of previous requests, reused when only the
+# intervention values change
+model_store = FittedModelStore(max_bytes=MODEL_STORE_MAX_BYTES)
+
+# background causal effect computations
+job_manager = JobManager(max_workers=JOB_WORKERS, max_age=JOB_MAX_AGE)
+
+# metrics read from the caches and the job manager whenever /metrics is scraped
+REGISTRY.register(CacheCollector({"result": result_cache, "fitted_model": model_store}))
+ACTIVE_JOBS.set_function(job_manager.n_active)
+DATASET_ROWS.set_function(lambda: dataset_cache.data.num_rows if dataset_cache.data is not None else 0)
+DATASET_BYTES.set_function(lambda: dataset_cache.data.nbytes if dataset_cache.data is not None else 0)
+
+
+@app.middleware("http")
+async def trace_requests(request: Request, call_next):
+    """
+    Record the stages of each request in a Trace (see tracing.py) and report
+    their durations in the Server-Timing header of the response. For streamed
+    responses, only the stages before the stream starts are included.
+    """
+    with start_trace() as trace:
+        response = await call_next(request)
+
+        server_timing = trace.server_timing()
+        response.headers["Server-Timing"] = server_timing
+        response.headers["Timing-Allow-Origin"] = "*"
+        if trace.profile_path is not None:
+            response.headers["X-Profile"] = trace.profile_path
+        logger.debug("%s %s: status=%d timing=%s", request.method, request.url.path,
+                     response.status_code, server_timing)
+
+    return response
+
+
+@app.middleware("http")
+async def count_requests(request: Request, call_next):
+    """
+    Count the requests and failed requests of each endpoint.
+    """
+    try:
+        response = await call_next(request)
+        status = response.status_code
+    except Exception:
+        status = 500
+        raise
+    finally:
+        # the router has set the endpoint by now, unless no route matched
+        endpoint = getattr(request.scope.get("endpoint"), "__name__", "unmatched")
+        REQUESTS.labels(endpoint=endpoint).inc()
+        if status >= 400:
+            ERRORS.labels(endpoint=endpoint, status=str(status)).inc()
+
+    return response
+
+
+@app.get("/metrics")
+def get_metrics():
+    """
+    Export the metrics of the server in the Prometheus text format.
+    """
+    return Response(generate_latest(REGISTRY), headers={"Content-Type": CONTENT_TYPE_LATEST})
+
 
 def isDataAvailable():
     return os.path.isfile(DATA_DESTINATION)
@@ -44,23 +163,31 @@ def isGraphAvailable():
     return os.path.isfile(GRAPH_DESTINATION)
 
 
-def read_data_safely():
+def read_data_safely(variables=None):
     """
     Read the user-uploaded data from file. Raise
     exception if either no data is available or the
     data does not conform to the required format.
+    Return the memory-mapped data (a pyarrow Table) and
+    the hash of the uploaded file. If a list of variables
+    is given, only these columns and "patient_id" and
+    "time" are returned.
     """
     if isDataAvailable():
-        data = pd.read_csv(DATA_DESTINATION)
+        data, data_hash = dataset_cache.get(DATA_DESTINATION)
 
         # check that data conforms to the requirements
-        error_msg = "data does not conform to requirements: must have " + \
-            'columns "patient_id" and "time"'
-        if ("patient_id" not in data.columns) or ("time" not in data.columns):
-            raise ValueError(error_msg)
+        check_required_columns(data.column_names)
+
+        if variables is not None:
+            missing = [name for name in variables if name not in data.column_names]
+            if missing:
+                raise ValueError("variables of the causal graph are missing in the data: "
+                                 + ", ".join(missing))
+            data = data.select(["patient_id", "time"] + list(variables))
 
         # if no exception was raised, return the data
-        return data
+        return data, data_hash
 
     else:
         raise Exception("the grouped graph is not available on file")
@@ -70,16 +197,16 @@ def read_graph_safely():
     """
     Read the user-defined grouped causal graph from file.
     Raise an exception if the file is not available or the
-    parsing process failed.
+    parsing process failed. Return the graph and its hash.
     """
     if isGraphAvailable():
-        causal_graph = read_graph()
+        causal_graph, graph_hash = read_graph()
         # check that the graph has the right class
         if not isinstance(causal_graph, GroupedCausalGraph):
             raise Exception("failed to parse causal graph!")
 
         # if no exception was raised, return causal graph
-        return causal_graph
+        return causal_graph, graph_hash
 
     else:
         raise Exception("failed to retrieve graph file")
@@ -88,29 +215,56 @@ def read_graph_safely():
 @app.post("/data")
 async def receive_data(file: UploadFile):
     """
-    Receive data uploaded by the user on the front end.
+    Receive data uploaded by the user on the front end. The
+    data can be a CSV, Parquet or Arrow IPC (Feather) file;
+    it is converted once to a columnar Arrow file that later
+    requests memory-map.
     """
 
-    dest_path = DATA_DESTINATION
-
-    # create file and store in temp folder
-    async with aiofiles.open(dest_path, "wb") as out_file:
-        while content := await file.read(1024):
-            await out_file.write(content)
-
-    # read file
-    """
-    f = open(dest_path, "rb")
-    content = f.read()
-    """
-
-    data = pd.read_csv(dest_path)
-    variables = list(data.columns)
-
-    # uncomment if you want to remove file after upload
-    # os.remove(dest_path)
-
-    return {"variables": variables}
+    dest_path = UPLOAD_DESTINATION
+    hasher = hashlib.sha256()
+    head = b""
+
+    # create file and store in temp folder; check the CSV header
+    # as soon as it has arrived instead of after the whole upload
+    try:
+        async with aiofiles.open(dest_path, "wb") as out_file:
+            while content := await file.read(UPLOAD_CHUNK_SIZE):
+                hasher.update(content)
+                await out_file.write(content)
+
+                if head is not None:
+                    head += content
+                    if detect_format_from_bytes(head) != "csv":
+                        head = None
+                    elif (columns := csv_header(head)) is not None:
+                        check_required_columns(columns)
+                        head = None
+    except ValueError as error:
+        os.remove(dest_path)
+        raise HTTPException(status_code=400, detail=str(error))
+
+    # convert the upload to the columnar storage format, one batch at a time
+    content_hash = hasher.hexdigest()
+    converted_path = DATA_DESTINATION + ".tmp"
+    try:
+        with observe_stage("load_data"):
+            schema = await run_in_threadpool(convert_upload, dest_path, converted_path, content_hash)
+        check_required_columns(schema.names)
+    except ValueError as error:
+        if os.path.isfile(converted_path):
+            os.remove(converted_path)
+        raise HTTPException(status_code=400, detail=str(error))
+    finally:
+        os.remove(dest_path)
+
+    os.replace(converted_path, DATA_DESTINATION)
+    dataset_cache.store(open_dataset(DATA_DESTINATION)[0], content_hash)
+
+    return {
+        "variables": schema.names,
+        "dtypes": {field.name: str(field.type) for field in schema},
+    }
 
 
 @app.get("/variables")
@@ -119,8 +273,9 @@ async def get_variables():
     Get the variables of the data uploaded by the user.
     """
     if isDataAvailable():
-        variables = list(pd.read_csv(DATA_DESTINATION).columns)
-        print(variables)
+        data, _ = dataset_cache.get(DATA_DESTINATION)
+        variables = data.column_names
+        logger.debug("variables: %s", variables)
         return variables
     else:
         raise Exception(
@@ -142,25 +297,172 @@ async def parse_graph(graph: dict = Body(...)):
     out : GroupedCausalGraph
         The GroupedCausalGraph corresponding to the input
     """
-    grouped_graph = parseGroupedGraph(graph)
+    with observe_stage("parse_graph"):
+        grouped_graph = parseGroupedGraph(graph)
+    graph_hash = hash_graph(grouped_graph)
 
-    with open(GRAPH_DESTINATION, "wb") as outfile:
-        pickle.dump(grouped_graph, outfile)
+    write_graph(grouped_graph, GRAPH_DESTINATION, graph_hash)
+    graph_cache.store(grouped_graph, graph_hash)
 
-    print("Pickled that graph!")
+    logger.info("saved graph: hash=%s variables=%d", graph_hash, len(grouped_graph.getVariableNames()))
 
 
 def read_graph():
     """
-    Read a grouped graph from file.
+    Read a grouped graph from file, or return the copy parsed
+    by a previous request. Return the graph and its hash.
+    """
+    return graph_cache.get(GRAPH_DESTINATION)
+
+
+class CausalEffectRequest(BaseModel):
+    """
+    Parameters of a causal effect computation, see get_causal_effect.
+    """
+    cause_variable: str
+    response_variable: str
+    min_intervention: float = 0
+    max_intervention: float = 5
+    min_delta_t: int = 1
+    max_delta_t: int = 10
+    n_gridpts_intervention: int = 11
+    joint_horizons: bool = False
+    n_jobs: int = 1
+    compact: bool = False
+    estimator: str = DEFAULT_ESTIMATOR
+    approximate: bool = False
+    bootstrap: int = 0
+
+
+def prepare_causal_effect(
+    cause_variable: str,
+    response_variable: str,
+    min_intervention: float,
+    max_intervention: float,
+    min_delta_t: int,
+    max_delta_t: int,
+    n_gridpts_intervention: int,
+    joint_horizons: bool,
+    n_jobs: int = 1,
+    compact: bool = False,
+    estimator: str = DEFAULT_ESTIMATOR,
+    approximate: bool = False,
+    bootstrap: int = 0,
+):
+    """
+    Collect the arguments of compute_causal_effect for a request, and the key
+    under which its result is stored in the result cache.
+
+    Returns
+    -------
+    out : tuple (dict, str)
+        Keyword arguments for compute_causal_effect and the cache key.
+    """
+    if n_jobs == 0 or n_jobs < -1:
+        raise HTTPException(status_code=400, detail="n_jobs must be a positive number or -1")
+    n_jobs = N_JOBS_MAX if n_jobs == -1 else min(n_jobs, N_JOBS_MAX)
+
+    causal_graph, graph_hash = read_graph_safely()
+
+    # only the variables in the causal graph are loaded
+    try:
+        data, data_hash = read_data_safely(variables=causal_graph.getVariableNames())
+    except ValueError as error:
+        raise HTTPException(status_code=400, detail=str(error))
+
+    # set the sequence of timeshifts between cause and response variables
+    delta_t_values = np.arange(min_delta_t, max_delta_t + 1)
+
+    # set the sequence of intervention values to consider
+    intervention_values = np.round(np.linspace(
+        min_intervention, max_intervention, n_gridpts_intervention), 1)
+
+    try:
+        model = make_estimator(estimator, multi_output=joint_horizons and len(delta_t_values) > 1)
+    except ValueError as error:
+        raise HTTPException(status_code=400, detail=str(error))
+    model_hash = hash_model(model)
+
+    # approximate results are computed from a fixed sample of patients
+    sample = (APPROXIMATE_N_PATIENTS, RANDOM_STATE) if approximate else None
+    bootstrap = min(max(bootstrap, 0), BOOTSTRAP_MAX_REPLICATES)
+
+    cache_key = ResultCache.make_key(
+        data_hash,
+        graph_hash,
+        cause_variable,
+        response_variable,
+        intervention_values,
+        delta_t_values,
+        model_hash,
+        joint_horizons,
+        compact,
+        sample,
+        bootstrap,
+    )
+
+    compute_kwargs = {
+        "data": data,
+        "causal_graph": causal_graph,
+        "cause_variable": cause_variable,
+        "response_variable": response_variable,
+        "delta_t_values": delta_t_values,
+        "intervention_values": intervention_values,
+        "model": model,
+        "joint_horizons": joint_horizons,
+        "n_jobs": n_jobs,
+        # the largest delta_t decides which rows are complete enough to be
+        # fitted on, so models are only reused for the same largest delta_t
+        "fitted_models": model_store.view(data_hash, graph_hash, cause_variable, response_variable, model_hash,
+                                          compact, sample, int(delta_t_values.max())),
+        "compact": compact,
+        "n_bootstrap": bootstrap,
+        "random_state": RANDOM_STATE,
+    }
+    if approximate:
+        compute_kwargs.update({
+            "n_sample_patients": APPROXIMATE_N_PATIENTS,
+            "standard_errors": True,
+        })
+
+    return compute_kwargs, cache_key
+
+
+def profiling(profile: bool, name: str):
+    """
+    Return a context manager that profiles the enclosed block to PROFILE_DIR
+    if profile is True (see tracing.profiled), and does nothing otherwise.
     """
+    return profiled(PROFILE_DIR, name) if profile else nullcontext()
 
-    with open(GRAPH_DESTINATION, "rb") as infile:
-        grouped_graph_reconstructed = pickle.load(infile)
 
-    print("Reconstructed that graph!")
+def timings_json():
+    """
+    Return the durations of the stages of the current request, for the
+    "timings" field of a response.
+    """
+    trace = current_trace()
+    if trace is None:
+        return {}
+    return {"stages": trace.totals(), "total_seconds": trace.elapsed()}
+
+
+@app.get("/estimators")
+def get_estimators():
+    """
+    List the regression models that can be selected for computing causal effects.
 
-    return grouped_graph_reconstructed
+    Returns
+    -------
+    out : dict with keys "default" and "estimators"
+        "estimators" is a list of dicts with the "name" and "description"
+        (speed/accuracy trade-off) of each model.
+    """
+    return {
+        "default": DEFAULT_ESTIMATOR,
+        "estimators": [{"name": estimator.name, "description": estimator.description}
+                       for estimator in ESTIMATORS.values()],
+    }
 
 
 @app.get("/causal_effect")
@@ -172,6 +474,15 @@ def get_causal_effect(
     min_delta_t: int = 1,
     max_delta_t: int = 10,
     n_gridpts_intervention: int = 11,
+    joint_horizons: bool = False,
+    n_jobs: int = 1,
+    compact: bool = False,
+    estimator: str = DEFAULT_ESTIMATOR,
+    approximate: bool = False,
+    bootstrap: int = 0,
+    timings: bool = False,
+    profile: bool = False,
+    accept: str = Header(None),
 ):
     """
     Compute causal effect of one dynamic variable on another.
@@ -192,6 +503,38 @@ def get_causal_effect(
         Time maximum time increment for which to compute causal effects
     n_gridpts_intervention : int
         The number of grid points for intervention values
+    joint_horizons : bool
+        If True, fit a single multi-output model for all delta_t values
+    n_jobs : int
+        Number of threads to use for the regressions (at most N_JOBS_MAX),
+        -1 for N_JOBS_MAX
+    compact : bool
+        If True, use float32 measurements, int32 keys and categorical static
+        variables to roughly halve the memory used
+    estimator : str
+        Name of the regression model to use, see GET /estimators
+    approximate : bool
+        If True, fit on a random sample of APPROXIMATE_N_PATIENTS patients
+        for a quick result, and also return "standard_errors" of the
+        causal effects
+    bootstrap : int
+        If positive, also return 95% confidence bands "lower" and "upper"
+        from at most this many (up to BOOTSTRAP_MAX_REPLICATES) patient-level
+        bootstrap replicates, run on n_jobs processes
+    timings : bool
+        If True, also return the "timings" of the stages of the request: the
+        total "seconds" and "count" of each stage and the "total_seconds" up
+        to serializing the result. The Server-Timing header of the response
+        holds the same durations.
+    profile : bool
+        If True, profile the request with cProfile and write the profile to
+        PROFILE_DIR; its path is returned in the X-Profile header. Fits run
+        in other threads or processes (n_jobs > 1) are not included.
+    accept : str
+        The Accept header, which selects the encoding of the result (see
+        result_encoding.result_response): JSON by default, an Arrow IPC
+        stream for "application/vnd.apache.arrow.stream", or raw float32
+        arrays for "application/x-causal-effect-grid".
 
     Returns
     -------
@@ -199,37 +542,224 @@ def get_causal_effect(
         Dictionary whose value at key 'causal_effects' is a 2D NumPy array that stores
         the causal effect for each combination of intervention value and delta_t value.
         The intervention value indexes the rows and the delta_t value indexes the columns
-        of this matrix.
+        of this matrix. Approximate results also have the key "standard_errors", and
+        bootstrapped results the keys "lower" and "upper", matrices of the same shape.
+        Missing values (e.g. effects that could not be computed) are null.
+    """
+    with profiling(profile, "get_causal_effect"):
+        compute_kwargs, cache_key = prepare_causal_effect(
+            cause_variable,
+            response_variable,
+            min_intervention,
+            max_intervention,
+            min_delta_t,
+            max_delta_t,
+            n_gridpts_intervention,
+            joint_horizons,
+            n_jobs,
+            compact,
+            estimator,
+            approximate,
+            bootstrap,
+        )
+        result_dict = result_cache.get(cache_key)
+        cached = result_dict is not None
+
+        if result_dict is None:
+            with ESTIMATIONS_IN_FLIGHT.track_inprogress():
+                result_dict = compute_causal_effect(**compute_kwargs)
+            result_cache.put(cache_key, result_dict)
+
+        logger.info("causal effect: cause=%s response=%s estimator=%s cells=%d cached=%s",
+                    cause_variable, response_variable, estimator, result_dict["causal_effects"].size, cached)
+        logger.debug("causal effect result: %s", result_dict)
+
+        with observe_stage("serialize"):
+            return result_response(result_dict, accept, {"timings": timings_json()} if timings else None)
+
+
+@app.post("/causal_effect/jobs")
+def submit_causal_effect_job(request: CausalEffectRequest):
     """
-    print("entered the function!")
+    Start computing a causal effect in the background and return immediately.
 
-    data = read_data_safely()
-    causal_graph = read_graph_safely()
+    Parameters
+    ----------
+    request : CausalEffectRequest
+        The same parameters as for GET /causal_effect.
 
-    # set the sequence of timeshifts between cause and response variables
-    delta_t_values = np.arange(min_delta_t, max_delta_t + 1)
+    Returns
+    -------
+    out : dict with key "job_id"
+        Identifier with which to poll GET /causal_effect/jobs/{job_id}.
+    """
+    compute_kwargs, cache_key = prepare_causal_effect(**request.dict())
 
-    # set the sequence of intervention values to consider
-    intervention_values = np.round(np.linspace(
-        min_intervention, max_intervention, n_gridpts_intervention), 1)
+    # the fitted models live in this process and are not shared with the workers,
+    # so nothing is lost by fitting the time shifts in processes of their own
+    compute_kwargs["fitted_models"] = None
+    compute_kwargs["processes"] = True
+    result_dict = result_cache.get(cache_key)
 
-    result_dict = compute_causal_effect(
-        data,
-        causal_graph,
-        cause_variable,
-        response_variable,
-        delta_t_values=delta_t_values,
-        intervention_values=intervention_values,
-    )
+    if result_dict is not None:
+        job_id = job_manager.add_finished(result_dict)
+    else:
+        # the worker memory-maps the data itself instead of receiving a copy
+        data = compute_kwargs.pop("data")
+        job_id = job_manager.submit(
+            DATA_DESTINATION,
+            data.column_names,
+            dataset_hash(data),
+            on_result=lambda result: result_cache.put(cache_key, result),
+            **compute_kwargs,
+        )
 
-    print("see below the backend output for the causal effects:")
-    print(result_dict)
-    print("finished computing causal effects, now returning results...")
+    return {"job_id": job_id}
 
-    result_json = {
-        "intervention": np.nan_to_num(result_dict["intervention"]).tolist(),
-        "delta_t": np.nan_to_num(result_dict["delta_t"]).tolist(),
-        "causal_effects": np.nan_to_num(result_dict["causal_effects"]).tolist(),
-    }
 
-    return result_json
+@app.get("/causal_effect/jobs/{job_id}")
+def get_causal_effect_job(job_id: str):
+    """
+    Report the status of a causal effect computation started with
+    POST /causal_effect/jobs.
+
+    Returns
+    -------
+    out : dict with keys "status", "progress", "result", and "error"
+        "status" is one of "pending", "running", "done", or "failed".
+        "progress" is the fraction of (delta_t, intervention) cells computed
+        so far. "result" has the same format as the output of GET /causal_effect
+        once the job is done, and "error" holds the error message of a failed job.
+    """
+    try:
+        status = job_manager.status(job_id)
+    except KeyError:
+        raise HTTPException(status_code=404, detail="no job with id " + job_id)
+
+    if status["result"] is not None:
+        status["result"] = result_to_json(status["result"])
+
+    return NumpyJSONResponse(status)
+
+
+def server_sent_event(event: str, payload: dict):
+    """
+    Format a payload as a Server-Sent Event.
+    """
+    return "event: " + event + "\ndata: " + dumps_json(payload).decode() + "\n\n"
+
+
+@app.get("/causal_effect/stream")
+async def stream_causal_effect(
+    cause_variable: str,
+    response_variable: str,
+    min_intervention: float = 0,
+    max_intervention: float = 5,
+    min_delta_t: int = 1,
+    max_delta_t: int = 10,
+    n_gridpts_intervention: int = 11,
+    joint_horizons: bool = False,
+    n_jobs: int = 1,
+    compact: bool = False,
+    estimator: str = DEFAULT_ESTIMATOR,
+    approximate: bool = False,
+    bootstrap: int = 0,
+    timings: bool = False,
+    profile: bool = False,
+):
+    """
+    Compute causal effect of one dynamic variable on another and stream each
+    column of the causal effects matrix as soon as it has been computed.
+
+    Takes the same parameters as GET /causal_effect; with timings=true, the
+    "timings" are part of the "done" event. The response is a stream of
+    Server-Sent Events:
+
+    - "start" with the "intervention" and "delta_t" values,
+    - "column" with the "index" and "delta_t" of a column and its "causal_effects",
+    - "done" with the full result in the format of GET /causal_effect, or
+      "error" with a "detail" message, after which the stream closes.
+    """
+    compute_kwargs, cache_key = await run_in_threadpool(
+        prepare_causal_effect,
+        cause_variable,
+        response_variable,
+        min_intervention,
+        max_intervention,
+        min_delta_t,
+        max_delta_t,
+        n_gridpts_intervention,
+        joint_horizons,
+        n_jobs,
+        compact,
+        estimator,
+        approximate,
+        bootstrap,
+    )
+    delta_t_values = compute_kwargs["delta_t_values"]
+    intervention_values = compute_kwargs["intervention_values"]
+
+    loop = asyncio.get_running_loop()
+    columns = asyncio.Queue()
+
+    def on_column(j, column):
+        loop.call_soon_threadsafe(columns.put_nowait, (j, column.copy()))
+
+    def column_event(j, column):
+        return server_sent_event("column", {
+            "index": j,
+            "delta_t": int(delta_t_values[j]),
+            "causal_effects": np.ascontiguousarray(column),
+        })
+
+    async def events():
+        yield server_sent_event("start", {
+            "intervention": intervention_values,
+            "delta_t": delta_t_values,
+        })
+
+        result_dict = result_cache.get(cache_key)
+        if result_dict is None:
+            def compute():
+                with profiling(profile, "stream_causal_effect"):
+                    return compute_causal_effect(column_callback=on_column, **compute_kwargs)
+
+            # compute in a copy of the request's context, so that the stages
+            # are recorded in its trace
+            ESTIMATIONS_IN_FLIGHT.inc()
+            task = loop.run_in_executor(None, copy_context().run, compute)
+            task.add_done_callback(lambda _: ESTIMATIONS_IN_FLIGHT.dec())
+            task.add_done_callback(lambda _: columns.put_nowait(None))
+
+            while (item := await columns.get()) is not None:
+                yield column_event(*item)
+
+            try:
+                result_dict = task.result()
+            except Exception as error:
+                # the stream has already started with status 200
+                ERRORS.labels(endpoint="stream_causal_effect", status="500").inc()
+                yield server_sent_event("error", {"detail": str(error)})
+                return
+            result_cache.put(cache_key, result_dict)
+        else:
+            for j in range(len(delta_t_values)):
+                yield column_event(j, result_dict["causal_effects"][:, j])
+
+        with observe_stage("serialize"):
+            result_json = result_to_json(result_dict)
+            if timings:
+                result_json["timings"] = timings_json()
+            done_event = server_sent_event("done", result_json)
+        yield done_event
+
+    return StreamingResponse(events(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache"})
+
+
+@app.on_event("shutdown")
+def shutdown_job_manager():
+    """
+    Stop the worker processes of the job manager.
+    """
+    job_manager.shutdown()
@@ -0,0 +1 @@
+from benchmarks.synthetic import make_graph_json, make_panel, cause_and_response
@@ -0,0 +1,267 @@
+import argparse
+import gc
+import json
+import os
+import platform
+import resource
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+import pyarrow.compute as pc
+
+from benchmarks.synthetic import make_graph_json, make_panel, cause_and_response
+from causal_inference import compute_causal_effect
+from data_store import convert_upload, open_dataset
+from estimators import make_estimator
+from parseGraph import parseGroupedGraph
+from result_encoding import RESULT_MEDIA_TYPES, result_response
+from tracing import start_trace
+
+# (number of patients, timesteps per patient) of the default benchmark runs
+SCALES = [(100, 50), (1000, 50), (1000, 200), (5000, 200)]
+
+# stages measured around the calls the backend makes for a request, in the
+# order in which they run; the result is serialized once in each media type
+# the backend can send
+STAGES = ["load", "graph", "estimate"] + ["serialize " + media_type for media_type in RESULT_MEDIA_TYPES]
+
+
+class StageTimer:
+    """
+    Measure the wall-clock time and the peak memory allocated by each stage of
+    a benchmark run, and by the stages the backend records inside it with
+    metrics.observe_stage (e.g. markov_transform, make_data_dict,
+    design_matrix, fit and predict inside compute_causal_effect).
+
+    Memory is traced with tracemalloc, which sees the Python and NumPy
+    allocations but not those made inside pyarrow (so the peaks of "load" and
+    of the Arrow encoding miss the Arrow buffers) or native model code, nor
+    those of worker processes, and slows down allocation-heavy Python code
+    somewhat.
+
+    Attributes
+    ----------
+    stages : dict[str, dict]
+        Maps each measured stage to its "seconds" and "peak_bytes". A stage
+        measured several times adds up the times and keeps the largest peak,
+        and counts the measurements in "calls".
+    inner_stages : dict[str, dict[str, dict]]
+        Maps each measured stage to the "seconds", "count" and "peak_bytes"
+        of the stages recorded inside it, if any.
+    """
+
+    def __init__(self):
+        """
+        Create a StageTimer with no measured stages.
+        """
+        self.stages = {}
+        self.inner_stages = {}
+
+    def measure(self, stage: str, function, *args, **kwargs):
+        """
+        Call function(*args, **kwargs), record its time and peak memory and
+        those of the stages inside it under stage, and return its result.
+        """
+        gc.collect()
+        tracemalloc.start()
+        with start_trace(trace_memory=True) as trace:
+            start = time.perf_counter()
+            try:
+                with trace.memory_span(stage):
+                    return function(*args, **kwargs)
+            finally:
+                seconds = time.perf_counter() - start
+                tracemalloc.stop()
+
+                record = self.stages.setdefault(stage, {"seconds": 0.0, "peak_bytes": 0, "calls": 0})
+                record["seconds"] += seconds
+                record["peak_bytes"] = max(record["peak_bytes"], trace.peak_bytes[stage])
+                record["calls"] += 1
+
+                inner = self.inner_stages.setdefault(stage, {})
+                for inner_stage, total in trace.totals().items():
+                    inner_record = inner.setdefault(inner_stage, {"seconds": 0.0, "count": 0, "peak_bytes": 0})
+                    inner_record["seconds"] += total["seconds"]
+                    inner_record["count"] += total["count"]
+                    inner_record["peak_bytes"] = max(inner_record["peak_bytes"],
+                                                     trace.peak_bytes.get(inner_stage, 0))
+
+
+def run_scale(
+    n_patients: int,
+    n_timesteps: int,
+    n_dynamic: int = 8,
+    n_static: int = 2,
+    density: float = 0.3,
+    max_time_to_effect: int = 3,
+    delta_t_values=(1, 2, 3),
+    n_interventions: int = 10,
+    estimator: str = "random_forest_subsampled",
+    joint_horizons: bool = False,
+    n_jobs: int = 1,
+    processes: bool = False,
+    compact: bool = False,
+    reuse_models: bool = False,
+    random_state: int = 0,
+):
+    """
+    Run compute_causal_effect once on a synthetic panel and graph, like the
+    backend runs it for a request, and measure each stage (see STAGES).
+
+    The time and peak memory of the stages inside compute_causal_effect
+    (markov_transform, make_data_dict, design_matrix, fit, predict, ...) are
+    recorded by metrics.observe_stage in the trace of the run, see StageTimer.
+    Fits and predictions made in worker processes (processes=True) are not
+    recorded there, only in "estimate".
+
+    Parameters
+    ----------
+    n_patients, n_timesteps : int
+        Size of the synthetic panel.
+    n_dynamic, n_static, density, max_time_to_effect :
+        Shape of the synthetic graph, see synthetic.make_graph_json.
+    delta_t_values : Iterable
+        Time shifts between cause and response.
+    n_interventions : int
+        Number of intervention values at which the fitted models predict.
+    estimator : str
+        Name of the estimator, one of the keys of estimators.ESTIMATORS.
+    joint_horizons, n_jobs, processes, compact :
+        See compute_causal_effect.
+    reuse_models : bool
+        If True, keep the fitted models and run the estimation a second
+        time with them, measured as "estimate (stored models)".
+    random_state : int
+        Seed for the synthetic graph and panel.
+
+    Returns
+    -------
+    out : dict
+        The parameters of the run, the size of the data, the measurements
+        of each stage and the stages recorded inside each estimation.
+    """
+    graph_json = make_graph_json(n_dynamic, n_static, density, max_time_to_effect, random_state)
+    panel = make_panel(graph_json, n_patients, n_timesteps, random_state)
+    cause, response = cause_and_response(graph_json)
+    timer = StageTimer()
+
+    with tempfile.TemporaryDirectory(prefix="benchmark_") as tmp_dir:
+        csv_path = os.path.join(tmp_dir, "panel.csv")
+        arrow_path = os.path.join(tmp_dir, "panel.arrow")
+        panel.to_csv(csv_path, index=False)
+        csv_bytes = os.path.getsize(csv_path)
+        del panel
+
+        timer.measure("load", convert_upload, csv_path, arrow_path, "")
+        table, _ = open_dataset(arrow_path)
+
+        graph = timer.measure("graph", parseGroupedGraph, graph_json)
+        table = table.select(["patient_id", "time"] + graph.getVariableNames())
+
+        cause_range = pc.min_max(table.column(cause))
+        intervention_values = np.linspace(cause_range["min"].as_py(), cause_range["max"].as_py(), n_interventions)
+        delta_t_values = np.asarray(delta_t_values)
+
+        fitted_models = {} if reuse_models else None
+        runs = ["estimate", "estimate (stored models)"] if reuse_models else ["estimate"]
+        for stage in runs:
+            model = make_estimator(estimator, multi_output=joint_horizons and len(delta_t_values) > 1)
+            result_dict = timer.measure(stage, compute_causal_effect, table, graph, cause, response,
+                                        delta_t_values, intervention_values, model=model,
+                                        joint_horizons=joint_horizons, n_jobs=n_jobs,
+                                        fitted_models=fitted_models, compact=compact,
+                                        processes=processes)
+
+        for media_type in RESULT_MEDIA_TYPES:
+            timer.measure("serialize " + media_type, result_response, result_dict, media_type)
+
+    return {
+        "parameters": {"n_patients": n_patients, "n_timesteps": n_timesteps,
+                       "n_dynamic": n_dynamic, "n_static": n_static, "density": density,
+                       "max_time_to_effect": max_time_to_effect,
+                       "delta_t_values": delta_t_values.tolist(),
+                       "n_interventions": n_interventions, "estimator": estimator,
+                       "joint_horizons": joint_horizons, "n_jobs": n_jobs, "processes": processes,
+                       "compact": compact, "reuse_models": reuse_models,
+                       "random_state": random_state},
+        "data": {"rows": n_patients * n_timesteps, "csv_bytes": csv_bytes,
+                 "markov_order": int(graph.max_time_to_effect),
+                 "graph_edges": sum(len(e) for e in graph.edges.values())},
+        "stages": {stage: timer.stages[stage] for stage in STAGES[:3] + runs[1:] + STAGES[3:]},
+        "pipeline": {stage: timer.inner_stages[stage] for stage in runs},
+    }
+
+
+def parse_scale(text: str):
+    """
+    Parse a scale given as "PATIENTS,TIMESTEPS".
+    """
+    n_patients, n_timesteps = text.split(",")
+    return int(n_patients), int(n_timesteps)
+
+
+def main(argv=None):
+    """
+    Run the benchmarks at several scales and write the results as JSON.
+    """
+    parser = argparse.ArgumentParser(
+        description="Measure the time and peak memory of each stage of the estimation "
+                    "pipeline on synthetic data. Run from the backend-project directory: "
+                    "python -m benchmarks.run_benchmarks")
+    parser.add_argument("--scale", type=parse_scale, action="append",
+                        help="PATIENTS,TIMESTEPS; may be repeated (default: "
+                             + " ".join(str(p) + "," + str(t) for p, t in SCALES) + ")")
+    parser.add_argument("--dynamic", type=int, default=8, help="number of dynamic variables")
+    parser.add_argument("--static", type=int, default=2, help="number of static variables")
+    parser.add_argument("--density", type=float, default=0.3, help="probability of each graph edge")
+    parser.add_argument("--max-time-to-effect", type=int, default=3)
+    parser.add_argument("--delta-t", type=int, nargs="+", default=[1, 2, 3])
+    parser.add_argument("--interventions", type=int, default=10, help="number of intervention values")
+    parser.add_argument("--estimator", default="random_forest_subsampled")
+    parser.add_argument("--joint", action="store_true", help="fit one model for all delta_t values")
+    parser.add_argument("--jobs", type=int, default=1, help="number of threads or processes, -1 for all cores")
+    parser.add_argument("--processes", action="store_true", help="fit the delta_t values in worker processes")
+    parser.add_argument("--compact", action="store_true", help="use the compact (float32) data layout")
+    parser.add_argument("--reuse-models", action="store_true",
+                        help="estimate a second time with the models fitted the first time")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="file to write the JSON results to (default: standard output)")
+    args = parser.parse_args(argv)
+
+    runs = []
+    for n_patients, n_timesteps in args.scale or SCALES:
+        runs.append(run_scale(n_patients, n_timesteps,
+                              n_dynamic=args.dynamic,
+                              n_static=args.static,
+                              density=args.density,
+                              max_time_to_effect=args.max_time_to_effect,
+                              delta_t_values=args.delta_t,
+                              n_interventions=args.interventions,
+                              estimator=args.estimator,
+                              joint_horizons=args.joint,
+                              n_jobs=args.jobs,
+                              processes=args.processes,
+                              compact=args.compact,
+                              reuse_models=args.reuse_models,
+                              random_state=args.seed))
+
+    report = {
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "machine": {"python": platform.python_version(), "platform": platform.platform(),
+                    "cpus": os.cpu_count()},
+        "max_rss_bytes": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024,
+        "runs": runs,
+    }
+
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as outfile:
+            outfile.write(text + "\n")
+    else:
+        print(text)
+
+
+if __name__ == "__main__":
+    main()
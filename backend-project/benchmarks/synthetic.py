@@ -0,0 +1,233 @@
+import numpy as np
+import pandas as pd
+
+# number of dynamic variables per dynamic group of the synthetic graphs
+GROUP_SIZE = 4
+
+
+def variable_names(n_dynamic: int, n_static: int):
+    """
+    Names of the variables of a synthetic panel.
+
+    Returns
+    -------
+    out : tuple (list of str, list of str)
+        The dynamic variables x0, x1, ... and the static variables s0, s1, ...
+    """
+    return (["x" + str(i) for i in range(n_dynamic)],
+            ["s" + str(i) for i in range(n_static)])
+
+
+def make_graph_json(
+    n_dynamic: int = 8,
+    n_static: int = 2,
+    density: float = 0.3,
+    max_time_to_effect: int = 3,
+    random_state=None,
+):
+    """
+    Generate a random causal graph over the variables of a synthetic panel,
+    in the JSON format sent by the frontend (see parseGraph.parseGroupedGraph).
+
+    The dynamic variables are split into groups of GROUP_SIZE variables and the
+    static variables form one static group. Every possible edge between two
+    dynamic groups, from the static group to a dynamic group and between two
+    variables of the same dynamic group is added with probability density.
+    The edge from the first to the last dynamic group is always added.
+
+    Parameters
+    ----------
+    n_dynamic : int
+        Number of dynamic variables, at least 2.
+    n_static : int
+        Number of static variables.
+    density : float
+        Probability of each possible edge, between 0 and 1.
+    max_time_to_effect : int
+        Largest maximum time-to-effect of the dynamic edges; the time-to-effect
+        of each edge starts at 1 and ends at a random value up to this one.
+    random_state : int | numpy Generator
+        Seed for drawing the edges.
+
+    Returns
+    -------
+    out : dict
+    """
+    if n_dynamic < 2:
+        raise ValueError("a synthetic graph needs at least 2 dynamic variables")
+
+    rng = np.random.default_rng(random_state)
+    dynamic, static = variable_names(n_dynamic, n_static)
+    groups = [dynamic[i:i + GROUP_SIZE] for i in range(0, n_dynamic, GROUP_SIZE)]
+    group_names = ["dynamic" + str(i) for i in range(len(groups))]
+
+    def time_to_effect():
+        return {"min": 1, "max": int(rng.integers(1, max_time_to_effect + 1))}
+
+    def group_edge(from_name, from_mode, to_name):
+        edge = {"from_node": {"name": from_name, "mode": from_mode},
+                "to_node": {"name": to_name, "mode": "dynamic"}}
+        if from_mode == "dynamic":
+            edge["time_to_effect"] = time_to_effect()
+        return edge
+
+    nodes = []
+    for name, variables in zip(group_names, groups):
+        edges = [{"from_node": {"name": a}, "to_node": {"name": b}, "time_to_effect": time_to_effect()}
+                 for a in variables for b in variables
+                 if a != b and rng.random() < density]
+        nodes.append({"name": name, "mode": "dynamic",
+                      "graph": {"nodes": [{"name": v} for v in variables], "edges": edges}})
+
+    edges = []
+    for i, from_name in enumerate(group_names):
+        for j, to_name in enumerate(group_names):
+            if i == j:
+                continue
+            if (i == 0 and j == len(groups) - 1) or rng.random() < density:
+                edges.append(group_edge(from_name, "dynamic", to_name))
+
+    if static:
+        nodes.append({"name": "static", "mode": "static",
+                      "graph": {"nodes": [{"name": v} for v in static], "edges": []}})
+        edges += [group_edge("static", "static", to_name)
+                  for to_name in group_names if rng.random() < density]
+
+    # the graph needs a dynamic edge, for the markov order of the estimation;
+    # with a single dynamic group, link its first and last variable
+    if len(groups) == 1:
+        inner_edges = nodes[0]["graph"]["edges"]
+        if not any(e["from_node"]["name"] == dynamic[0] and e["to_node"]["name"] == dynamic[-1]
+                   for e in inner_edges):
+            inner_edges.append({"from_node": {"name": dynamic[0]}, "to_node": {"name": dynamic[-1]},
+                                "time_to_effect": time_to_effect()})
+
+    return {"nodes": nodes, "edges": edges}
+
+
+def cause_and_response(graph_json: dict):
+    """
+    Choose the cause and the response variable of a graph made by
+    make_graph_json. The response is the last variable of the last dynamic
+    group; the cause is the variable with the most parents among the others,
+    so that the design matrix grows with the density of the graph.
+
+    Returns
+    -------
+    out : tuple (str, str)
+        The names of the cause and the response variable.
+    """
+    dynamic_groups = [node for node in graph_json["nodes"] if node["mode"] == "dynamic"]
+    group_sizes = {node["name"]: len(node["graph"]["nodes"]) for node in graph_json["nodes"]}
+
+    n_parents = {}
+    for node in dynamic_groups:
+        n_group_parents = sum(group_sizes[edge["from_node"]["name"]] for edge in graph_json["edges"]
+                              if edge["to_node"]["name"] == node["name"])
+        for variable in node["graph"]["nodes"]:
+            n_parents[variable["name"]] = n_group_parents + sum(
+                edge["to_node"]["name"] == variable["name"] for edge in node["graph"]["edges"])
+
+    response = dynamic_groups[-1]["graph"]["nodes"][-1]["name"]
+    del n_parents[response]
+    return max(n_parents, key=n_parents.get), response
+
+
+def lag_weights(graph_json: dict, n_dynamic: int, max_time_to_effect: int, rng):
+    """
+    Draw the weights with which each dynamic variable depends on the lagged
+    dynamic variables, following the edges of graph_json.
+
+    Returns
+    -------
+    out : 3D NumPy array
+        Array W of shape (max_time_to_effect + 1, n_dynamic, n_dynamic) where
+        W[lag, i, j] is the effect of variable j at time t - lag on variable i
+        at time t.
+    """
+    dynamic, _ = variable_names(n_dynamic, 0)
+    index = {name: i for i, name in enumerate(dynamic)}
+    members = {node["name"]: [index[v["name"]] for v in node["graph"]["nodes"]]
+               for node in graph_json["nodes"] if node["mode"] == "dynamic"}
+
+    W = np.zeros((max_time_to_effect + 1, n_dynamic, n_dynamic))
+
+    def connect(parents, children, time_to_effect):
+        lags = slice(time_to_effect["min"], time_to_effect["max"] + 1)
+        for child in children:
+            for parent in parents:
+                W[lags, child, parent] = rng.uniform(-1, 1)
+
+    for node in graph_json["nodes"]:
+        for edge in node["graph"]["edges"]:
+            connect([index[edge["from_node"]["name"]]], [index[edge["to_node"]["name"]]],
+                    edge["time_to_effect"])
+    for edge in graph_json["edges"]:
+        if edge["from_node"]["mode"] == "dynamic":
+            connect(members[edge["from_node"]["name"]], members[edge["to_node"]["name"]],
+                    edge["time_to_effect"])
+
+    # scale the weights so that the process is stable (the total absolute
+    # weight on each variable, including its own autoregression, stays below 1)
+    total = np.abs(W).sum(axis=(0, 2))
+    W *= 0.4 / np.maximum(total, 0.4)[None, :, None]
+    return W
+
+
+def make_panel(
+    graph_json: dict,
+    n_patients: int = 100,
+    n_timesteps: int = 50,
+    random_state=None,
+):
+    """
+    Generate a long-format panel with columns [patient_id, time, x0, x1, ...,
+    s0, s1, ...] from a vector autoregressive process following the edges of a
+    graph made by make_graph_json. Every dynamic variable also depends on its
+    own previous value and on the static variables.
+
+    Parameters
+    ----------
+    graph_json : dict
+        Output of make_graph_json.
+    n_patients : int
+        Number of patients.
+    n_timesteps : int
+        Number of timesteps per patient.
+    random_state : int | numpy Generator
+        Seed for drawing the weights and the noise.
+
+    Returns
+    -------
+    out : Pandas DataFrame
+        The panel, sorted by patient_id and time.
+    """
+    rng = np.random.default_rng(random_state)
+    n_dynamic = sum(len(node["graph"]["nodes"]) for node in graph_json["nodes"] if node["mode"] == "dynamic")
+    n_static = sum(len(node["graph"]["nodes"]) for node in graph_json["nodes"] if node["mode"] == "static")
+    dynamic, static = variable_names(n_dynamic, n_static)
+
+    max_time_to_effect = max([edge["time_to_effect"]["max"] for node in graph_json["nodes"]
+                              for edge in node["graph"]["edges"]]
+                             + [edge["time_to_effect"]["max"] for edge in graph_json["edges"]
+                                if "time_to_effect" in edge])
+    W = lag_weights(graph_json, n_dynamic, max_time_to_effect, rng)
+    W[1] += 0.5 * np.eye(n_dynamic)
+
+    static_values = rng.normal(size=(n_patients, n_static))
+    static_effect = static_values @ rng.uniform(-0.5, 0.5, size=(n_static, n_dynamic))
+
+    # simulate all patients at once, one timestep after the other
+    values = np.zeros((n_timesteps, n_patients, n_dynamic))
+    noise = rng.normal(size=values.shape)
+    for t in range(n_timesteps):
+        values[t] = static_effect + noise[t]
+        for lag in range(1, min(t, max_time_to_effect) + 1):
+            values[t] += values[t - lag] @ W[lag].T
+
+    panel = pd.DataFrame(values.transpose(1, 0, 2).reshape(-1, n_dynamic), columns=dynamic)
+    panel.insert(0, "patient_id", np.repeat(np.arange(n_patients), n_timesteps))
+    panel.insert(1, "time", np.tile(np.arange(n_timesteps), n_patients))
+    for k, name in enumerate(static):
+        panel[name] = np.repeat(static_values[:, k], n_timesteps)
+    return panel
@@ -0,0 +1,394 @@
+import hashlib
+import os
+import pickle
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+import pyarrow as pa
+
+from data_store import open_dataset
+from graph_store import load_graph
+from Graphs import GroupedCausalGraph, D2DGroupedCausalEdge
+
+
+def hash_graph(causal_graph: GroupedCausalGraph):
+    """
+    Compute a canonical hash of a GroupedCausalGraph.
+
+    The hash only depends on the groups, variables and edges of the graph
+    (including times-to-effect), not on the order in which they were added.
+
+    Returns
+    -------
+    out : str
+        Hexadecimal SHA-256 digest describing the graph.
+    """
+    groups = []
+    for group in causal_graph.nodes.values():
+        edges = sorted(
+            (from_name, to_name, repr(edge.time_to_effect))
+            for from_name, edge_dict in group.graph.edges.items()
+            for to_name, edge in edge_dict.items()
+        )
+        groups.append((group.name, group.isDynamic(), sorted(group.graph.nodes), edges))
+
+    grouped_edges = sorted(
+        (from_name, to_name, type(edge).__name__,
+         repr(edge.time_to_effect) if isinstance(edge, D2DGroupedCausalEdge) else "")
+        for from_name, edge_dict in causal_graph.edges.items()
+        for to_name, edge in edge_dict.items()
+    )
+
+    description = repr((sorted(groups), grouped_edges))
+    return hashlib.sha256(description.encode()).hexdigest()
+
+
+def hash_model(model):
+    """
+    Compute a hash of the configuration of an sklearn-style model.
+    """
+    description = type(model).__name__ + repr(sorted(model.get_params().items()))
+    return hashlib.sha256(description.encode()).hexdigest()
+
+
+class DatasetCache:
+    """
+    The user-uploaded dataset, memory-mapped from its columnar file.
+
+    The data is converted once when it is uploaded and kept until a new upload
+    replaces it, so that repeated requests do not parse the file again. The
+    cached table is shared between requests.
+
+    Attributes
+    ----------
+    content_hash : str
+        SHA-256 hash of the uploaded file the cached data was converted from.
+    data : pyarrow Table
+        The memory-mapped data.
+    """
+
+    def __init__(self):
+        """
+        Create an empty DatasetCache.
+        """
+        self.content_hash: str = None
+        self.data: pa.Table = None
+        self._lock = threading.Lock()
+
+    def store(self, data: pa.Table, content_hash: str):
+        """
+        Replace the cached data with newly uploaded data.
+        """
+        with self._lock:
+            self.data = data
+            self.content_hash = content_hash
+
+    def invalidate(self):
+        """
+        Remove the cached data.
+        """
+        self.store(None, None)
+
+    def get(self, path: str):
+        """
+        Return the cached data. If nothing is cached yet (e.g. after a server
+        restart), memory-map the dataset file at path and cache it first.
+
+        Parameters
+        ----------
+        path : str
+            Path to the dataset file written by data_store.write_dataset,
+            used only if nothing is cached.
+
+        Returns
+        -------
+        out : tuple (pyarrow Table, str)
+            The data and the hash of the file it was converted from.
+        """
+        with self._lock:
+            if self.data is None:
+                self.data, self.content_hash = open_dataset(path)
+            return self.data, self.content_hash
+
+
+class GraphCache:
+    """
+    The user-defined grouped causal graph, parsed once and shared between
+    requests until a new graph replaces it.
+
+    Attributes
+    ----------
+    content_hash : str
+        Hash of the cached graph, see hash_graph.
+    graph : GroupedCausalGraph
+        The parsed graph.
+    """
+
+    def __init__(self):
+        """
+        Create an empty GraphCache.
+        """
+        self.content_hash: str = None
+        self.graph: GroupedCausalGraph = None
+        self._lock = threading.Lock()
+
+    def store(self, graph: GroupedCausalGraph, content_hash: str):
+        """
+        Replace the cached graph with a newly parsed graph.
+        """
+        with self._lock:
+            self.graph = graph
+            self.content_hash = content_hash
+
+    def invalidate(self):
+        """
+        Remove the cached graph.
+        """
+        self.store(None, None)
+
+    def get(self, path: str):
+        """
+        Return the cached graph. If nothing is cached yet (e.g. after a server
+        restart), read the graph file at path and cache it first.
+
+        Parameters
+        ----------
+        path : str
+            Path to the graph file written by graph_store.write_graph, used
+            only if nothing is cached.
+
+        Returns
+        -------
+        out : tuple (GroupedCausalGraph, str)
+            The graph and its hash.
+        """
+        with self._lock:
+            if self.graph is None:
+                self.graph, self.content_hash = load_graph(path)
+            return self.graph, self.content_hash
+
+
+class ResultCache:
+    """
+    Bounded least-recently-used cache for causal effect results.
+
+    Entries expire after max_age seconds. When more than max_entries results
+    are held in memory, the least recently used ones are evicted; if spill_dir
+    is given, evicted results are written there and read back on a later hit.
+
+    Attributes
+    ----------
+    hits : int
+        Number of lookups that found a result.
+    misses : int
+        Number of lookups that did not find a result.
+    """
+
+    def __init__(self, max_entries: int = 64, max_age: float = 3600, spill_dir: str = None):
+        """
+        Create an empty ResultCache.
+
+        Parameters
+        ----------
+        max_entries : int
+            Maximum number of results held in memory.
+        max_age : float
+            Number of seconds after which a result expires.
+        spill_dir : str
+            Directory to which evicted results are written. If None, evicted
+            results are discarded.
+        """
+        self.max_entries = max_entries
+        self.max_age = max_age
+        self.spill_dir = spill_dir
+        self.hits = 0
+        self.misses = 0
+        self._entries: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+
+        if spill_dir:
+            os.makedirs(spill_dir, exist_ok=True)
+
+    @staticmethod
+    def make_key(*parts):
+        """
+        Combine the given parts (hashes, names, arrays, ...) into a cache key.
+        """
+        description = repr([np.asarray(part).tolist() if isinstance(part, (np.ndarray, list, tuple))
+                            else part for part in parts])
+        return hashlib.sha256(description.encode()).hexdigest()
+
+    def _spill_path(self, key: str):
+        return os.path.join(self.spill_dir, key + ".npz")
+
+    def get(self, key: str):
+        """
+        Return the result stored under key, or None if there is none.
+        """
+        with self._lock:
+            now = time.time()
+            if key in self._entries:
+                timestamp, result = self._entries[key]
+                if now - timestamp <= self.max_age:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return result
+                del self._entries[key]
+
+            if self.spill_dir and os.path.isfile(self._spill_path(key)):
+                path = self._spill_path(key)
+                timestamp = os.path.getmtime(path)
+                if now - timestamp <= self.max_age:
+                    with np.load(path, allow_pickle=False) as spilled:
+                        result = {name: spilled[name] for name in spilled.files}
+                    os.remove(path)
+                    self._insert(key, result, timestamp)
+                    self.hits += 1
+                    return result
+                os.remove(path)
+
+            self.misses += 1
+            return None
+
+    def put(self, key: str, result: dict):
+        """
+        Store a result (dict of NumPy arrays) under key.
+        """
+        with self._lock:
+            self._insert(key, result, time.time())
+
+    def clear(self):
+        """
+        Remove all results from memory and disk.
+        """
+        with self._lock:
+            self._entries.clear()
+            if self.spill_dir:
+                for filename in os.listdir(self.spill_dir):
+                    if filename.endswith(".npz"):
+                        os.remove(os.path.join(self.spill_dir, filename))
+
+    def _insert(self, key, result, timestamp):
+        self._entries[key] = (timestamp, result)
+        self._entries.move_to_end(key)
+
+        while len(self._entries) > self.max_entries:
+            evicted_key, (evicted_timestamp, evicted_result) = self._entries.popitem(last=False)
+            if self.spill_dir and time.time() - evicted_timestamp <= self.max_age:
+                path = self._spill_path(evicted_key)
+                np.savez(path, **evicted_result)
+                os.utime(path, (evicted_timestamp, evicted_timestamp))
+
+
+def estimate_model_size(model):
+    """
+    Estimate the memory used by a fitted model, in bytes.
+
+    For tree ensembles, add up the sizes of the node and value arrays of all
+    trees; for other models, use the size of the pickled model.
+    """
+    trees = [getattr(estimator, "tree_", None) for estimator in
+             np.ravel(getattr(model, "estimators_", []))]
+    if trees and all(tree is not None for tree in trees):
+        return sum(tree.__getstate__()["nodes"].nbytes + tree.__getstate__()["values"].nbytes
+                   for tree in trees)
+    return len(pickle.dumps(model, protocol=pickle.HIGHEST_PROTOCOL))
+
+
+class FittedModelStore:
+    """
+    Least-recently-used store of fitted regression models, bounded by the
+    estimated memory used by the models.
+
+    Attributes
+    ----------
+    total_bytes : int
+        Estimated memory used by the stored models.
+    hits : int
+        Number of lookups that found a model.
+    misses : int
+        Number of lookups that did not find a model.
+    """
+
+    def __init__(self, max_bytes: int = 1 << 30):
+        """
+        Create an empty FittedModelStore.
+
+        Parameters
+        ----------
+        max_bytes : int
+            Maximum estimated memory of the stored models. Least recently used
+            models are evicted when the budget is exceeded.
+        """
+        self.max_bytes = max_bytes
+        self.total_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._entries: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str):
+        """
+        Return the model stored under key, or None if there is none.
+        """
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return self._entries[key][0]
+            self.misses += 1
+            return None
+
+    def put(self, key: str, model):
+        """
+        Store a fitted model under key. Models larger than the memory budget
+        are not stored.
+        """
+        size = estimate_model_size(model)
+        if size > self.max_bytes:
+            return
+
+        with self._lock:
+            if key in self._entries:
+                self.total_bytes -= self._entries.pop(key)[1]
+            self._entries[key] = (model, size)
+            self.total_bytes += size
+
+            while self.total_bytes > self.max_bytes:
+                _, (_, evicted_size) = self._entries.popitem(last=False)
+                self.total_bytes -= evicted_size
+
+    def view(self, *key_parts):
+        """
+        Return a FittedModelView of the models stored for the given key parts
+        (e.g. hashes of data, graph and model configuration).
+        """
+        return FittedModelView(self, ResultCache.make_key(*key_parts))
+
+
+class FittedModelView:
+    """
+    The models of a FittedModelStore that belong to one estimation problem
+    (including the largest delta_t, which sets the rows the models are fitted
+    on), indexed by delta_t. Can be passed as fitted_models to
+    compute_causal_effect.
+    """
+
+    def __init__(self, store: FittedModelStore, base_key: str):
+        """
+        Create a FittedModelView.
+        """
+        self.store = store
+        self.base_key = base_key
+
+    def _key(self, delta_t):
+        delta_t = tuple(int(d) for d in delta_t) if np.ndim(delta_t) else int(delta_t)
+        return ResultCache.make_key(self.base_key, delta_t)
+
+    def get(self, delta_t):
+        return self.store.get(self._key(delta_t))
+
+    def __setitem__(self, delta_t, model):
+        self.store.put(self._key(delta_t), model)
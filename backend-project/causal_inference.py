@@ -1,10 +1,28 @@
 from typing import Iterable
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, FIRST_COMPLETED, as_completed, wait
+from contextvars import copy_context
 import pandas as pd
 import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
+from joblib import effective_n_jobs
+from sklearn.base import clone
+from threadpoolctl import threadpool_limits
 
 from Graphs import GroupedCausalGraph
+from metrics import observe_stage
+from shared_arrays import SharedArrays, attach_arrays
 
 from sklearn.ensemble import RandomForestRegressor
+from sklearn.linear_model import LinearRegression, Ridge
+from sklearn.multioutput import MultiOutputRegressor
+
+# number of rows per block when accumulating the normal equations of the
+# closed-form linear engine
+LINEAR_BLOCK_ROWS = 1 << 16
+
+# arrays shared with the worker processes, attached by init_worker
+_shared = {}
 
 
 def set_df_index(data):
@@ -24,6 +42,202 @@ def set_df_index(data):
     return data.set_index(["patient_id", "time"])
 
 
+def sample_patients(data, n_patients: int, random_state=None):
+    """
+    Keep the rows of a random subset of patients, so that the time series
+    of the sampled patients stay intact.
+
+    Parameters
+    ----------
+    data : Pandas DataFrame or pyarrow Table, must have column patient_id
+        Input data.
+    n_patients : int
+        Number of patients to sample. If the data has at most n_patients
+        patients, it is returned as is.
+    random_state : int | None
+        Seed of the random number generator.
+
+    Returns
+    -------
+    out : Pandas DataFrame or pyarrow Table
+        The rows of the sampled patients, in their original order.
+    """
+    if isinstance(data, pa.Table):
+        patient_ids = data.column("patient_id")
+        unique_ids = pc.unique(patient_ids).to_numpy(zero_copy_only=False)
+    else:
+        patient_ids = data["patient_id"]
+        unique_ids = patient_ids.unique()
+
+    if len(unique_ids) <= n_patients:
+        return data
+
+    rng = np.random.default_rng(random_state)
+    sampled_ids = rng.choice(np.sort(unique_ids), size=n_patients, replace=False)
+
+    if isinstance(data, pa.Table):
+        return data.filter(pc.is_in(patient_ids, value_set=pa.array(sampled_ids, type=patient_ids.type)))
+    return data.loc[patient_ids.isin(sampled_ids).to_numpy()]
+
+
+def patient_codes(data_dict: dict):
+    """
+    Number the patients of the samples in a data dict.
+
+    Returns
+    -------
+    out : tuple (1D NumPy array of int, int)
+        The patient number (0, 1, ...) of each sample and the number of patients.
+    """
+    codes, patient_ids = pd.factorize(data_dict["present"].index.get_level_values("patient_id"))
+    return codes, len(patient_ids)
+
+
+def patient_standard_error(predictions, patients, n_patients: int):
+    """
+    Estimate the standard error of the mean of predictions over the samples,
+    treating the patients (not the samples) as independent (cluster-robust
+    standard error). Only the variability of the averaging over patients is
+    taken into account, not the variability of the fitted model.
+
+    Parameters
+    ----------
+    predictions : 2D NumPy array of shape (n_means, n_samples)
+        Each row holds the predictions whose mean is taken.
+    patients : 1D NumPy array of int
+        The patient number of each sample, see patient_codes.
+    n_patients : int
+        The number of patients.
+
+    Returns
+    -------
+    out : 1D NumPy array of length n_means
+        The standard error of the mean of each row.
+    """
+    predictions = np.asarray(predictions, dtype=np.float64)
+    if n_patients < 2:
+        return np.full(predictions.shape[0], np.nan)
+
+    n_samples = predictions.shape[1]
+    counts = np.bincount(patients, minlength=n_patients)
+    standard_errors = np.empty(predictions.shape[0])
+    for i, row in enumerate(predictions):
+        patient_sums = np.bincount(patients, weights=row, minlength=n_patients)
+        residuals = patient_sums - counts * (patient_sums.sum() / n_samples)
+        standard_errors[i] = np.sqrt(n_patients / (n_patients - 1) * (residuals ** 2).sum()) / n_samples
+    return standard_errors
+
+
+def float_dtype(df):
+    """
+    Return float32 if all columns of df are float32, and float64 otherwise.
+    """
+    return np.float32 if all(dtype == np.float32 for dtype in df.dtypes) else np.float64
+
+
+def compact_dtypes(df, var_static, var_dynamic):
+    """
+    Convert a long-format data frame to a compact representation: float32 for
+    the dynamic variables and numeric static variables, pandas categoricals
+    for the other static variables, and int32 for patient_id and time (if
+    their values fit).
+
+    Parameters
+    ----------
+    df : Pandas DataFrame, must have columns [patient_id, time]
+        Input data in the proper format.
+    var_static : list of string
+        List of static variable names.
+    var_dynamic : list of string
+        List of dynamic variable names.
+
+    Returns
+    -------
+    df : Pandas DataFrame
+        The data with compact column types.
+    """
+    int32_info = np.iinfo(np.int32)
+    dtypes = {}
+
+    for name in ["patient_id", "time"]:
+        column = df[name]
+        if pd.api.types.is_integer_dtype(column) and (len(column) == 0 or (
+                int32_info.min <= column.min() and column.max() <= int32_info.max)):
+            dtypes[name] = np.int32
+
+    for name in var_dynamic:
+        dtypes[name] = np.float32
+
+    for name in var_static:
+        if pd.api.types.is_numeric_dtype(df[name]) and not pd.api.types.is_bool_dtype(df[name]):
+            dtypes[name] = np.float32
+        else:
+            dtypes[name] = "category"
+
+    return df.astype(dtypes)
+
+
+def shift_within_patients(df, shifts):
+    """
+    Shift all columns of a panel data frame by several time steps at once,
+    without mixing observations of different patients.
+
+    The rows are sorted by (patient_id, time) once and the patient boundaries
+    are located once; every shifted copy is then an array slice in which the
+    rows that would cross a patient boundary are set to NaN.
+
+    Parameters
+    ----------
+    df : Pandas DataFrame, must have hierarchical index [patient_id, time]
+        Input data in the proper format.
+    shifts : Iterable of int
+        Time shifts to compute. Positive values shift backwards in time (lags),
+        negative values shift forwards in time (leads), as in pandas.Series.shift.
+
+    Returns
+    -------
+    out : dict[int, NumPy array]
+        Maps each shift to an array with the same shape as df whose rows are
+        aligned with the rows of df. The arrays are float32 if all columns of
+        df are float32, and float64 otherwise.
+    """
+    patient_ids = df.index.get_level_values("patient_id").to_numpy()
+    times = df.index.get_level_values("time").to_numpy()
+    n_rows = len(df)
+
+    # sort once by patient and time, and remember how to undo the sorting
+    order = np.lexsort((times, patient_ids))
+    inverse = np.empty_like(order)
+    inverse[order] = np.arange(n_rows)
+
+    values = df.to_numpy(dtype=float_dtype(df))[order]
+    sorted_ids = patient_ids[order]
+
+    # locate the patient boundaries once: for every row, its position within the
+    # patient's series and the number of rows that follow it in that series
+    is_start = np.ones(n_rows, dtype=bool)
+    is_start[1:] = sorted_ids[1:] != sorted_ids[:-1]
+    group_starts = np.flatnonzero(is_start)
+    group_lengths = np.diff(np.append(group_starts, n_rows))
+    position = np.arange(n_rows) - np.repeat(group_starts, group_lengths)
+    remaining = np.repeat(group_lengths, group_lengths) - position - 1
+
+    shifted = {}
+    for shift in shifts:
+        out = np.full_like(values, np.nan)
+        if 0 < shift < n_rows:
+            out[shift:] = values[:-shift]
+            out[position < shift] = np.nan
+        elif 0 < -shift < n_rows:
+            out[:shift] = values[-shift:]
+            out[remaining < -shift] = np.nan
+        elif shift == 0:
+            out[:] = values
+        shifted[shift] = out[inverse]
+
+    return shifted
+
+
 def markov_transform(df, order=5, max_delta_t=0):
     """
     Shift variables backwards and forwards in time. Add new columns in the
@@ -45,28 +259,21 @@ def markov_transform(df, order=5, max_delta_t=0):
         triple of data frames (past_df, present_df, future_df)
         DataFrames contain columns corresponding to time-shifted copies of variables.
     """
+    past_shifts = list(range(1, order + 1))
+    future_shifts = list(range(-max_delta_t, 0))
+    shifted = shift_within_patients(df, past_shifts + future_shifts)
 
-    past_df = pd.concat(
-        [
-            df.groupby(level="patient_id")
-            .transform(lambda s: s.shift(i))
-            .rename(lambda name: name + "_tm" + str(i), axis="columns")
-            for i in range(1, order + 1)
-        ],
-        axis=1,
-    )
+    def shifted_frame(shifts, suffix):
+        columns = [name + suffix + str(abs(i)) for i in shifts for name in df.columns]
+        if not shifts:
+            return pd.DataFrame(index=df.index, columns=columns, dtype=float_dtype(df))
+        return pd.DataFrame(np.hstack([shifted[i] for i in shifts]), index=df.index, columns=columns)
+
+    past_df = shifted_frame(past_shifts, "_tm")
 
     present_df = df  # df.rename(lambda name: name+"_t0", axis='columns')
 
-    future_df = pd.concat(
-        [
-            df.groupby(level="patient_id")
-            .transform(lambda s: s.shift(i))
-            .rename(lambda name: name + "_tp" + str(-i), axis="columns")
-            for i in range(-max_delta_t, 0)
-        ],
-        axis=1,
-    )
+    future_df = shifted_frame(future_shifts, "_tp")
 
     return (past_df, present_df, future_df)
 
@@ -79,12 +286,14 @@ def make_data_dict(
     markov_order=5,
     max_delta_t=3,
     dummies_for_categorical=False,
+    compact=False,
 ):
     """
     Transform long-format data frame into wide format.
 
-    df : Pandas DataFrame, must have columns [patient_id, time]
-        Input data in the proper format.
+    df : Pandas DataFrame or pyarrow Table, must have columns [patient_id, time]
+        Input data in the proper format. Only the columns of the relevant
+        variables are loaded (from disk, if a memory-mapped pyarrow Table).
     order : int
         Order of the Markov model (how many timesteps to go backwards)
     max_delta_t : int
@@ -99,9 +308,10 @@ def make_data_dict(
     dummies_for_categorical : bool
         Determine whether static categorical variables should be converted to
         dummy coding. Convert if True, do not convert otherwise.
+    compact : bool
+        If True, store the data in compact types (see compact_dtypes), which
+        roughly halves the memory used by the time-shifted copies.
     """
-    new_df = df.set_index(["patient_id", "time"])
-
     if causal_graph:
         static_nodes, dynamic_nodes = causal_graph.getStaticDynamicNodes()
         var_static = [node.name for node in static_nodes]
@@ -109,36 +319,307 @@ def make_data_dict(
     elif (not var_static) or (not var_dynamic):
         raise Exception("list of arguments is missing either static or dynamic variables")
 
-    past_df, present_df, future_df = markov_transform(
-        new_df.loc[:, var_dynamic], order=markov_order, max_delta_t=max_delta_t
-    )
+    # only load and index the columns of the relevant variables
+    columns = ["patient_id", "time"] + var_static + var_dynamic
+    if isinstance(df, pa.Table):
+        df = df.select(columns).to_pandas()
+    else:
+        df = df.loc[:, columns]
+
+    if compact:
+        df = compact_dtypes(df, var_static, var_dynamic)
+
+    new_df = df.set_index(["patient_id", "time"])
+
+    with observe_stage("markov_transform"):
+        past_df, present_df, future_df = markov_transform(
+            new_df.loc[:, var_dynamic], order=markov_order, max_delta_t=max_delta_t
+        )
     static_df = new_df.loc[:, var_static]
 
+    # keep the rows without missing values in any of the data frames; the mask
+    # is computed frame by frame to avoid concatenating all of them
+    complete = (past_df.notna().all(axis=1).to_numpy()
+                & present_df.notna().all(axis=1).to_numpy()
+                & future_df.notna().all(axis=1).to_numpy())
+
     # check if there are static variables
     if len(var_static) > 0:
-        common_idx = pd.concat([past_df, present_df, future_df, static_df], axis=1).dropna().index
+        complete &= static_df.notna().all(axis=1).to_numpy()
 
         data = {
-            "past": past_df.loc[common_idx],
-            "present": present_df.loc[common_idx],
-            "future": future_df.loc[common_idx],
-            "static": pd.get_dummies(static_df.loc[common_idx])
+            "past": past_df.loc[complete],
+            "present": present_df.loc[complete],
+            "future": future_df.loc[complete],
+            "static": pd.get_dummies(static_df.loc[complete])
             if dummies_for_categorical
-            else static_df.loc[common_idx],
+            else static_df.loc[complete],
         }
     else:
-        common_idx = pd.concat([past_df, present_df, future_df], axis=1).dropna().index
-
         data = {
-            "past": past_df.loc[common_idx],
-            "present": present_df.loc[common_idx],
-            "future": future_df.loc[common_idx],
+            "past": past_df.loc[complete],
+            "present": present_df.loc[complete],
+            "future": future_df.loc[complete],
             "static": None,
         }
 
     return data
 
 
+def limit_threads(n_threads: int):
+    """
+    Return a context manager that limits the OpenMP threads of native code
+    called from the current thread to n_threads, for models whose threads
+    n_jobs does not control (e.g. HistGradientBoostingRegressor). OpenMP
+    limits only apply to the thread that sets them, so concurrent requests
+    keep their own budgets. BLAS thread pools are process-wide and are only
+    limited in worker processes, see init_worker.
+    """
+    return threadpool_limits(limits=n_threads, user_api="openmp")
+
+
+def model_with_n_jobs(model, n_jobs: int):
+    """
+    Return an unfitted copy of model that uses n_jobs threads, if the model
+    supports the n_jobs parameter. Otherwise return an unfitted copy as is.
+    """
+    model_copy = clone(model)
+    if "n_jobs" in model_copy.get_params():
+        model_copy.set_params(n_jobs=n_jobs)
+    return model_copy
+
+
+def design_matrix(
+    data_dict: dict,
+    causal_graph: GroupedCausalGraph,
+    cause_variable: str,
+    dummies_for_categorical=True,
+    compact=False,
+):
+    """
+    Build the design matrix of the regressions of the responses on the cause
+    variable and the variables to condition on.
+
+    Parameters
+    ----------
+    data_dict : dictionary
+        The output of the function make_data_dict
+    causal_graph : GroupedCausalGraph
+        Causal graph specifying causal relationships between variables.
+    cause_variable : str
+        Name of the cause variable
+    dummies_for_categorical : bool
+        Convert static categorical variables to dummy coding if True.
+    compact : bool
+        If True, build the design matrix in float32 instead of float64.
+
+    Returns
+    -------
+    X : 2D NumPy array
+        The lagged dynamic parents, the static parents, and (in the last
+        column) the cause variable, one row per sample.
+    """
+    with observe_stage("design_matrix"):
+        # get correct variables to condition on (parents of the causal variable),
+        # precompiled by the graph
+        plan = causal_graph.getConditioningPlan(cause_variable)
+        if plan is None:
+            raise Exception("could not find the cause variable in the graph!")
+        parents_static = plan.static_parents
+        parents_dynamic = plan.dynamic_parents
+
+        # the data we condition on during the regressions stays the same
+        data_past = data_dict["past"].loc[:, parents_dynamic]
+
+        # check if the data contains any static variables to condition on; a cause
+        # without static parents gets no static columns, since get_dummies cannot
+        # encode an empty selection of the static data
+        has_static_parents = data_dict["static"] is not None and len(parents_static) > 0
+        if has_static_parents:
+
+            data_static = (
+                pd.get_dummies(data_dict["static"].loc[:, parents_static])
+                if dummies_for_categorical
+                else data_dict["static"].loc[:, parents_static]
+            )
+
+            X_df = pd.concat([data_past, data_static, data_dict["present"][cause_variable]], axis=1)
+        else:
+            X_df = pd.concat([data_past, data_dict["present"][cause_variable]], axis=1)
+
+        return X_df.to_numpy(dtype=np.float32 if compact else np.float64)
+
+
+def linear_model_alpha(model):
+    """
+    Return the L2 penalty of a linear regression model with intercept that the
+    closed-form linear engine can compute exactly (0 for ordinary least squares),
+    or None if the model is not such a model.
+    """
+    if type(model) is LinearRegression and model.fit_intercept:
+        return 0.0
+    if type(model) is Ridge and model.fit_intercept and np.ndim(model.alpha) == 0:
+        return float(model.alpha)
+    return None
+
+
+def response_matrix(data_dict: dict, response_variable: str, delta_t_values: Iterable, dtype=np.float64):
+    """
+    Return the responses for all delta_t values as a 2D NumPy array with one
+    column per delta_t value.
+    """
+    response_columns = [response_variable + "_tp" + str(delta_t) for delta_t in delta_t_values]
+    return data_dict["future"].loc[:, response_columns].to_numpy(dtype=dtype)
+
+
+def linear_fit(X, Y, alpha=0.0):
+    """
+    Fit linear regressions with intercept of each column of Y on X by solving
+    the normal equations.
+
+    The data is centered so that the intercept drops out of the normal
+    equations, and the cross products are accumulated in float64 over
+    blocks of rows.
+
+    Returns
+    -------
+    out : tuple (2D NumPy array, 1D NumPy array, 1D NumPy array)
+        The coefficients (one column per column of Y) and the column means
+        of X and Y.
+    """
+    n_samples, n_features = X.shape
+    X_mean = X.mean(axis=0, dtype=np.float64)
+    Y_mean = Y.mean(axis=0, dtype=np.float64)
+    gram = np.zeros((n_features, n_features))
+    cross = np.zeros((n_features, Y.shape[1]))
+    for start in range(0, n_samples, LINEAR_BLOCK_ROWS):
+        X_block = X[start:start + LINEAR_BLOCK_ROWS] - X_mean
+        gram += X_block.T @ X_block
+        cross += X_block.T @ (Y[start:start + LINEAR_BLOCK_ROWS] - Y_mean)
+
+    gram[np.diag_indices_from(gram)] += alpha
+    coefficients = np.linalg.lstsq(gram, cross, rcond=None)[0]
+    return coefficients, X_mean, Y_mean
+
+
+def linear_effects(coefficients, X_mean, Y_mean, intervention_values):
+    """
+    Compute the mean predictions of the linear regressions fitted by linear_fit
+    with the cause variable (last column of X) set to each intervention value.
+    """
+    # the prediction at the column means is Y_mean; moving the cause variable
+    # from its mean to v adds (v - mean) times its coefficient
+    return Y_mean + np.outer(np.asarray(intervention_values) - X_mean[-1], coefficients[-1])
+
+
+def effects_from_matrices(X, Y, intervention_values, model):
+    """
+    Fit model on the design matrix X for each column of the responses Y, one
+    after the other, and return the mean predictions with the cause variable
+    (last column of X) set to each intervention value.
+
+    Returns
+    -------
+    causal_effects : 2D NumPy array of shape (len(intervention_values), Y.shape[1])
+    """
+    alpha = linear_model_alpha(model)
+    if alpha is not None:
+        return linear_effects(*linear_fit(X, Y, alpha=alpha), intervention_values)
+
+    # the responses are fitted one at a time
+    if isinstance(model, MultiOutputRegressor):
+        model = model.estimator
+
+    n_samples = X.shape[0]
+    X_intervention = stack_interventions(X, intervention_values)
+
+    causal_effects = np.zeros((len(intervention_values), Y.shape[1]))
+    for j in range(Y.shape[1]):
+        column_model = clone(model).fit(X, Y[:, j])
+        causal_effects[:, j] = column_model.predict(X_intervention).reshape(len(intervention_values), n_samples).mean(axis=1)
+    return causal_effects
+
+
+def linear_causal_effect_from_data_dict(
+    data_dict: dict,
+    causal_graph: GroupedCausalGraph,
+    cause_variable: str,
+    response_variable: str,
+    delta_t_values: Iterable,
+    intervention_values: Iterable,
+    alpha=0.0,
+    dummies_for_categorical=True,
+    progress_callback=None,
+    column_callback=None,
+    compact=False,
+    standard_errors=False,
+):
+    """
+    Compute the causal effect of cause_variable on response_variable with a
+    linear regression (with intercept) for every delta_t, in closed form.
+
+    All delta_t values share the design matrix, so their regressions are
+    solved together from the normal equations. The mean prediction with the
+    cause variable set to an intervention value v is then the column means of
+    the design matrix times the coefficients, with the mean of the cause
+    variable replaced by v; the effects are computed with a single outer
+    product instead of predicting on a counterfactual copy of the data.
+
+    Parameters
+    ----------
+    data_dict, causal_graph, cause_variable, response_variable, delta_t_values,
+    intervention_values, dummies_for_categorical, progress_callback,
+    column_callback, compact, standard_errors
+        See causal_effect_from_data_dict.
+    alpha : float
+        L2 penalty on the coefficients (not on the intercept), as in
+        sklearn's Ridge. 0 for ordinary least squares.
+
+    Returns
+    -------
+    causal_effect_data : dict with keys 'intervention', 'delta_t', and 'causal_effects'
+        See causal_effect_from_data_dict.
+    """
+    intervention_values = np.asarray(intervention_values)
+
+    X = design_matrix(data_dict, causal_graph, cause_variable,
+                      dummies_for_categorical=dummies_for_categorical, compact=compact)
+    Y = response_matrix(data_dict, response_variable, delta_t_values, dtype=X.dtype)
+
+    with observe_stage("fit"):
+        coefficients, X_mean, Y_mean = linear_fit(X, Y, alpha=alpha)
+    with observe_stage("predict"):
+        causal_effects = linear_effects(coefficients, X_mean, Y_mean, intervention_values)
+    result = {"intervention": intervention_values, "delta_t": delta_t_values, "causal_effects": causal_effects}
+
+    if standard_errors:
+        # the predictions only vary between samples through the other columns,
+        # so the standard errors are the same for all intervention values
+        patients, n_patients = patient_codes(data_dict)
+        deviations = (X[:, :-1] - X_mean[:-1]) @ coefficients[:-1]
+        delta_t_errors = patient_standard_error(deviations.T, patients, n_patients)
+        result["standard_errors"] = np.tile(delta_t_errors, (len(intervention_values), 1))
+
+    if column_callback:
+        for j in range(len(delta_t_values)):
+            column_callback(j, causal_effects[:, j])
+    if progress_callback:
+        progress_callback(causal_effects.size, causal_effects.size)
+
+    return result
+
+
+def stack_interventions(X, intervention_values):
+    """
+    Stack one counterfactual copy of the design matrix X per intervention
+    value, with the cause variable (last column) set to that intervention
+    value. Row i * len(X) + k is row k of X under the i-th intervention value.
+    """
+    X_intervention = np.tile(X, (len(intervention_values), 1))
+    X_intervention[:, -1] = np.repeat(intervention_values, X.shape[0])
+    return X_intervention
+
+
 def causal_effect_from_data_dict(
     data_dict: dict,
     causal_graph: GroupedCausalGraph,
@@ -148,6 +629,14 @@ def causal_effect_from_data_dict(
     intervention_values: Iterable,
     model=RandomForestRegressor(),
     dummies_for_categorical=True,
+    joint_horizons=False,
+    progress_callback=None,
+    column_callback=None,
+    n_jobs=1,
+    fitted_models=None,
+    compact=False,
+    standard_errors=False,
+    processes=False,
 ):
     """
     Compute the causal effect of cause_variable on response_variable.
@@ -172,6 +661,39 @@ def causal_effect_from_data_dict(
     dummies_for_categorical : bool
         Determine whether static categorical variables should be converted to
         dummy coding. Convert if True, do not convert otherwise.
+    joint_horizons : bool
+        If True, fit a single multi-output model on the responses for all
+        delta_t values at once instead of one model per delta_t. The model
+        must support multi-output regression (e.g. RandomForestRegressor).
+    progress_callback : callable
+        If given, called as progress_callback(cells_done, cells_total) whenever
+        a column of the causal_effects matrix has been computed.
+    column_callback : callable
+        If given, called as column_callback(j, column) with the j-th column of
+        the causal_effects matrix as soon as it has been computed.
+    n_jobs : int
+        Number of threads to use, -1 for all cores. The per-delta_t regressions
+        are run in parallel, and the threads left over are given to the model
+        itself, through its n_jobs parameter if it has one and by limiting its
+        OpenMP threads otherwise. With n_jobs=1, model is fitted directly, one
+        delta_t after the other, on one thread.
+    fitted_models : dict-like
+        If given, maps delta_t values to models already fitted for this data,
+        graph, cause, response and model configuration. These models are used
+        for prediction instead of fitting new ones, and newly fitted models are
+        added to it. In joint_horizons mode, the key is the tuple of delta_t values.
+    compact : bool
+        If True, build the design matrix in float32 instead of float64.
+    standard_errors : bool
+        If True, also estimate the standard error of each causal effect from
+        the variability of the predictions between patients, see
+        patient_standard_error.
+    processes : bool
+        If True and n_jobs > 1, run the per-delta_t regressions in worker
+        processes instead of threads, for models that hold the GIL. The design
+        matrix and the responses are placed in shared memory once and attached
+        read-only by the workers. Models fitted by the workers are not added
+        to fitted_models. Not used with joint_horizons.
 
     Returns
     -------
@@ -179,61 +701,351 @@ def causal_effect_from_data_dict(
         Dictionary whose value at key 'causal_effects' is a 2D NumPy array that stores
         the causal effect for each combination of intervention value and delta_t value.
         The intervention value indexes the rows and the delta_t value indexes the columns
-        of this matrix.
+        of this matrix. If standard_errors is True, the key 'standard_errors' holds
+        a matrix of the same shape with the standard errors.
     """
 
+    intervention_values = np.asarray(intervention_values)
     causal_effects = np.zeros(shape=(len(intervention_values), len(delta_t_values)))
+    effect_errors = np.full(causal_effects.shape, np.nan) if standard_errors else None
 
-    # get causal node corresponding to cause_variable
-    cause_node = causal_graph.getFlattenedNode(cause_variable)
-    if not cause_node:
-        raise Exception("could not find the cause variable in the graph!")
+    X = design_matrix(data_dict, causal_graph, cause_variable,
+                      dummies_for_categorical=dummies_for_categorical, compact=compact)
+    n_samples = X.shape[0]
+    if standard_errors:
+        patients, n_patients = patient_codes(data_dict)
 
-    # get correct nodes to condition on (parents of the causal variable)
-    parent_nodes = causal_graph.getParents(cause_node)
-    parents_static = [node.name for node in parent_nodes if node.isStatic()]
+    # the counterfactual copies of the design matrix are only built where the
+    # models predict in this process (worker processes predict row by row)
+    X_intervention = None
 
-    # create the temporal copies, for example X_tm1, X_tm2, X_tm3... for node X
-    parents_dynamic_nodes = [node for node in parent_nodes if node.isDynamic()]
-    parents_dynamic = []
-    for dyn_parent in parents_dynamic_nodes:
-        parents_dynamic += causal_graph.getTemporalCopiesOfParent(parent_node=dyn_parent, effect_node=cause_node)
+    n_jobs = effective_n_jobs(n_jobs)
 
-    # make sure we don't have any parents that aren't in the data
+    if joint_horizons:
+        joint_key = tuple(delta_t_values)
+        fitted_model = fitted_models.get(joint_key) if fitted_models is not None else None
 
-    # the data we condition on during the regressions stays the same
-    data_past = data_dict["past"].loc[:, parents_dynamic]
+        if fitted_model is None:
+            if n_jobs > 1 or fitted_models is not None:
+                model = model_with_n_jobs(model, n_jobs)
 
-    # check if the data contains any static variables
-    if data_dict["static"] is not None:
+            # the responses for all time shifts share the same design matrix, so
+            # fit them jointly as one multi-output regression
+            Y = response_matrix(data_dict, response_variable, delta_t_values)
+            with limit_threads(n_jobs), observe_stage("fit"):
+                model.fit(X, Y if Y.shape[1] > 1 else Y.ravel())
 
-        data_static = (
-            pd.get_dummies(data_dict["static"].loc[:, parents_static])
-            if dummies_for_categorical
-            else data_dict["static"].loc[:, parents_static]
-        )
+            if fitted_models is not None:
+                fitted_models[joint_key] = model
+        else:
+            model = fitted_model
 
-        X_df = pd.concat([data_past, data_static, data_dict["present"][cause_variable]], axis=1)
-    else:
-        X_df = pd.concat([data_past, data_dict["present"][cause_variable]], axis=1)
+        X_intervention = stack_interventions(X, intervention_values)
+        with limit_threads(n_jobs), observe_stage("predict"):
+            pred = model.predict(X_intervention).reshape(len(intervention_values), n_samples, -1)
+        causal_effects[:, :] = pred.mean(axis=1)
+        if standard_errors:
+            effect_errors[:, :] = patient_standard_error(
+                pred.transpose(0, 2, 1).reshape(-1, n_samples), patients, n_patients
+            ).reshape(causal_effects.shape)
+
+        if column_callback:
+            for j in range(len(delta_t_values)):
+                column_callback(j, causal_effects[:, j])
+        if progress_callback:
+            progress_callback(causal_effects.size, causal_effects.size)
+
+        return effect_result(intervention_values, delta_t_values, causal_effects, effect_errors)
+
+    def effect_for_delta_t(delta_t_model, delta_t, n_threads):
+        fitted_model = fitted_models.get(delta_t) if fitted_models is not None else None
+
+        if fitted_model is not None:
+            delta_t_model = fitted_model
+        else:
+            if fitted_models is not None:
+                # stored models must not be refitted for the next delta_t
+                delta_t_model = clone(delta_t_model)
 
-    # now loop over different intervention values, as well as
-    # different time shifts between cause and effect
-    for i, intervention_val in enumerate(intervention_values):
-        for j, delta_t in enumerate(delta_t_values):
             # define response variable for regression
             y = data_dict["future"][response_variable + "_tp" + str(delta_t)].values
 
             # carry out the regression
-            X = X_df.values
-            model.fit(X, y)
+            with limit_threads(n_threads), observe_stage("fit"):
+                delta_t_model.fit(X, y)
+
+            if fitted_models is not None:
+                fitted_models[delta_t] = delta_t_model
+
+        # predict with cause variable set to each intervention value
+        with limit_threads(n_threads), observe_stage("predict"):
+            pred = delta_t_model.predict(X_intervention).reshape(len(intervention_values), n_samples)
+        errors = patient_standard_error(pred, patients, n_patients) if standard_errors else None
+        return pred.mean(axis=1), errors
 
-            # predict with cause variable set to intervention_value
-            X_intervention = np.concatenate([X[:, :-1], intervention_val * np.ones(shape=(X.shape[0], 1))], axis=1)
-            pred = model.predict(X_intervention)
-            causal_effects[i, j] = np.mean(pred)
+    def store_column(j, column_and_errors, n_columns_done):
+        column, errors = column_and_errors
+        causal_effects[:, j] = column
+        if errors is not None:
+            effect_errors[:, j] = errors
+        if column_callback:
+            column_callback(j, causal_effects[:, j])
+        if progress_callback:
+            progress_callback(n_columns_done * len(intervention_values), causal_effects.size)
 
-    return {"intervention": intervention_values, "delta_t": delta_t_values, "causal_effects": causal_effects}
+    # split the thread budget between the delta_t values and the model itself
+    n_workers = min(n_jobs, len(delta_t_values))
+    n_model_jobs = max(1, n_jobs // max(n_workers, 1))
+
+    # the regression target only depends on delta_t, so fit once per time shift
+    # and evaluate all intervention values against the same fitted model
+    if n_workers <= 1:
+        X_intervention = stack_interventions(X, intervention_values)
+        if n_jobs > 1:
+            model = model_with_n_jobs(model, n_jobs)
+        for j, delta_t in enumerate(delta_t_values):
+            store_column(j, effect_for_delta_t(model, delta_t, n_jobs), j + 1)
+    elif processes:
+        # models stored for some delta_t values only need to predict here
+        n_columns_done = 0
+        to_fit = []
+        for j, delta_t in enumerate(delta_t_values):
+            if fitted_models is not None and fitted_models.get(delta_t) is not None:
+                if X_intervention is None:
+                    X_intervention = stack_interventions(X, intervention_values)
+                n_columns_done += 1
+                store_column(j, effect_for_delta_t(model, delta_t, n_jobs), n_columns_done)
+            else:
+                to_fit.append((j, delta_t))
+
+        if to_fit:
+            shared = {"X": X, "Y": response_matrix(data_dict, response_variable,
+                                                   [delta_t for _, delta_t in to_fit])}
+            if standard_errors:
+                shared["patients"] = patients
+
+            n_workers = min(n_jobs, len(to_fit))
+            n_model_jobs = max(1, n_jobs // n_workers)
+            worker_model = model_with_n_jobs(model, n_model_jobs)
+            with SharedArrays(**shared) as arrays, \
+                    ProcessPoolExecutor(max_workers=n_workers, initializer=init_worker,
+                                        initargs=(arrays.handles, n_model_jobs)) as executor:
+                futures = {
+                    executor.submit(shared_column_effect, k, intervention_values, worker_model,
+                                    standard_errors): j
+                    for k, (j, _) in enumerate(to_fit)
+                }
+                for future in as_completed(futures):
+                    n_columns_done += 1
+                    store_column(futures[future], future.result(), n_columns_done)
+    else:
+        X_intervention = stack_interventions(X, intervention_values)
+        # each regression limits its own threads to the per-model budget, so
+        # that the parallel regressions do not oversubscribe the cores
+        with ThreadPoolExecutor(max_workers=n_workers) as executor:
+            # run each regression in a copy of the caller's context, so that its
+            # stages are recorded in the trace of the request (see tracing.py)
+            futures = {
+                executor.submit(copy_context().run, effect_for_delta_t,
+                                model_with_n_jobs(model, n_model_jobs), delta_t, n_model_jobs): j
+                for j, delta_t in enumerate(delta_t_values)
+            }
+            for n_columns_done, future in enumerate(as_completed(futures), start=1):
+                store_column(futures[future], future.result(), n_columns_done)
+
+    return effect_result(intervention_values, delta_t_values, causal_effects, effect_errors)
+
+
+def effect_result(intervention_values, delta_t_values, causal_effects, effect_errors=None):
+    """
+    Collect the output of causal_effect_from_data_dict in a dict.
+    """
+    result = {"intervention": intervention_values, "delta_t": delta_t_values, "causal_effects": causal_effects}
+    if effect_errors is not None:
+        result["standard_errors"] = effect_errors
+    return result
+
+
+def init_worker(handles: dict, n_threads: int = 1):
+    """
+    Attach a worker process to the arrays shared by its parent (read-only,
+    without copying them; see shared_arrays.SharedArrays), and limit the
+    native thread pools of the worker to n_threads threads.
+    """
+    _shared.clear()
+    _shared.update(attach_arrays(handles))
+    threadpool_limits(limits=n_threads)
+
+
+def shared_column_effect(j: int, intervention_values, model, standard_errors=False):
+    """
+    Compute the j-th column of the causal effects matrix in a worker process
+    from the shared design matrix "X" and responses "Y" (and the patient
+    numbers "patients", if standard_errors is True).
+
+    Returns
+    -------
+    out : tuple (1D NumPy array, 1D NumPy array | None)
+        The causal effects and their standard errors (None if not requested).
+    """
+    X = _shared["X"]
+    model = model.fit(X, _shared["Y"][:, j])
+
+    # predict one intervention value at a time, so that the worker only
+    # holds one counterfactual copy of the design matrix
+    X_intervention = np.array(X)
+    pred = np.empty((len(intervention_values), X.shape[0]))
+    for i, value in enumerate(intervention_values):
+        X_intervention[:, -1] = value
+        pred[i] = model.predict(X_intervention)
+
+    if standard_errors:
+        patients = _shared["patients"]
+        return pred.mean(axis=1), patient_standard_error(pred, patients, patients.max() + 1)
+    return pred.mean(axis=1), None
+
+
+def bootstrap_replicate(seed: int, intervention_values, model):
+    """
+    Compute the causal effects on one patient-level bootstrap sample of the
+    shared arrays: patients are drawn with replacement, and all rows of a
+    drawn patient are used.
+    """
+    patient_order = _shared["patient_order"]
+    patient_starts = _shared["patient_starts"]
+    n_patients = len(patient_starts) - 1
+
+    rng = np.random.default_rng(seed)
+    patients = rng.integers(0, n_patients, size=n_patients)
+    rows = np.concatenate([patient_order[patient_starts[p]:patient_starts[p + 1]] for p in patients])
+
+    return effects_from_matrices(_shared["X"][rows], _shared["Y"][rows], intervention_values, model)
+
+
+def percentile_bands(replicates, confidence: float):
+    """
+    Return the lower and upper percentile bands of a stack of bootstrap
+    replicates of the causal effects matrix.
+    """
+    tail = 50 * (1 - confidence)
+    lower, upper = np.percentile(np.stack(replicates), [tail, 100 - tail], axis=0)
+    return lower, upper
+
+
+def bootstrap_causal_effect(
+    data_dict: dict,
+    causal_graph,
+    cause_variable: str,
+    response_variable: str,
+    delta_t_values: Iterable,
+    intervention_values: Iterable,
+    model,
+    n_bootstrap=200,
+    min_bootstrap=40,
+    check_every=10,
+    tolerance=0.02,
+    confidence=0.95,
+    n_jobs=1,
+    random_state=None,
+    dummies_for_categorical=True,
+    compact=False,
+):
+    """
+    Compute percentile confidence bands of the causal effects with a patient-level
+    bootstrap, running the replicates on a pool of worker processes.
+
+    The design matrix and the responses are placed once in shared memory that
+    all workers attach to, instead of being sent to each replicate. Replicates
+    are added until n_bootstrap have been computed or, after min_bootstrap, the
+    bands change by less than tolerance times their mean width between two
+    checks (every check_every replicates).
+
+    Replicate i always uses the i-th seed, and the checks and the bands only
+    use the replicates of the first seeds that have all finished, so the result
+    does not depend on the order in which the workers finish.
+
+    Parameters
+    ----------
+    data_dict, causal_graph, cause_variable, response_variable, delta_t_values,
+    intervention_values, model, dummies_for_categorical, compact
+        See causal_effect_from_data_dict.
+    n_bootstrap : int
+        Maximum number of bootstrap replicates.
+    min_bootstrap : int
+        Number of replicates computed before stopping early is considered.
+    check_every : int
+        Number of replicates between two checks of the bands.
+    tolerance : float
+        Relative change of the bands below which the bootstrap stops early.
+    confidence : float
+        Confidence level of the bands, e.g. 0.95 for the 2.5% and 97.5% percentiles.
+    n_jobs : int
+        Number of worker processes, -1 for all cores.
+    random_state : int | None
+        Seed of the bootstrap samples.
+
+    Returns
+    -------
+    out : dict with keys 'lower', 'upper', and 'n_bootstrap'
+        The lower and upper bands (2D NumPy arrays shaped like the causal effects
+        matrix) and the number of replicates they were computed from.
+    """
+    if n_bootstrap < 1:
+        raise ValueError("n_bootstrap must be at least 1")
+
+    intervention_values = np.asarray(intervention_values)
+    X = design_matrix(data_dict, causal_graph, cause_variable,
+                      dummies_for_categorical=dummies_for_categorical, compact=compact)
+    Y = response_matrix(data_dict, response_variable, delta_t_values, dtype=X.dtype)
+
+    # rows of each patient: patient_order[patient_starts[p]:patient_starts[p + 1]]
+    patients, n_patients = patient_codes(data_dict)
+    patient_order = np.argsort(patients, kind="stable")
+    patient_starts = np.concatenate([[0], np.cumsum(np.bincount(patients, minlength=n_patients))])
+
+    seeds = np.random.SeedSequence(random_state).generate_state(n_bootstrap)
+    model = model_with_n_jobs(model, 1)
+    n_workers = min(effective_n_jobs(n_jobs), n_bootstrap)
+
+    # replicates[i] is computed from seeds[i]; the first n_ready have finished
+    replicates = [None] * n_bootstrap
+    n_ready = 0
+    bands = None
+    with SharedArrays(X=X, Y=Y, patient_order=patient_order, patient_starts=patient_starts) as shared:
+        with ProcessPoolExecutor(max_workers=n_workers, initializer=init_worker,
+                                 initargs=(shared.handles,)) as executor:
+            pending = {}
+            next_seed = 0
+            while n_ready < n_bootstrap:
+                # keep every worker busy with one replicate and one queued replicate
+                while next_seed < n_bootstrap and len(pending) < 2 * n_workers:
+                    future = executor.submit(bootstrap_replicate, int(seeds[next_seed]),
+                                             intervention_values, model)
+                    pending[future] = next_seed
+                    next_seed += 1
+
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    replicates[pending.pop(future)] = future.result()
+
+                # check the bands at each multiple of check_every finished seeds
+                while n_ready < n_bootstrap and replicates[n_ready] is not None:
+                    n_ready += 1
+                    if n_ready >= min_bootstrap and n_ready % check_every == 0:
+                        new_bands = percentile_bands(replicates[:n_ready], confidence)
+                        if bands is not None:
+                            width = np.mean(new_bands[1] - new_bands[0])
+                            change = max(np.max(np.abs(new_bands[0] - bands[0])),
+                                         np.max(np.abs(new_bands[1] - bands[1])))
+                            if change <= tolerance * width:
+                                n_bootstrap = n_ready
+                        bands = new_bands
+
+            for future in pending:
+                future.cancel()
+
+    lower, upper = percentile_bands(replicates[:n_bootstrap], confidence)
+    return {"lower": lower, "upper": upper, "n_bootstrap": n_bootstrap}
 
 
 def compute_causal_effect(
@@ -244,13 +1056,24 @@ def compute_causal_effect(
     delta_t_values: Iterable,
     intervention_values: Iterable,
     model=RandomForestRegressor(),
+    joint_horizons=False,
+    progress_callback=None,
+    column_callback=None,
+    n_jobs=1,
+    fitted_models=None,
+    compact=False,
+    n_sample_patients=None,
+    random_state=None,
+    standard_errors=False,
+    n_bootstrap=0,
+    processes=False,
 ):
     """
     End-to-end computation of causal effects.
 
     Parameters
     ----------
-    data : Pandas DataFrame, must have columns [patient_id, time] (!!!)
+    data : Pandas DataFrame or pyarrow Table, must have columns [patient_id, time] (!!!)
         Input data in the proper format.
     causal_graph : GroupedCausalGraph
         Causal graph specifying causal relationships between variables.
@@ -263,7 +1086,43 @@ def compute_causal_effect(
     intervention_values : Iterable
         Sequence of intervention values
     model : supervised regression model satisfying sklearn API
-        The regression model to use for computing causal effects
+        The regression model to use for computing causal effects. For
+        LinearRegression and Ridge models, the effects are computed in closed
+        form by linear_causal_effect_from_data_dict (fitted_models, n_jobs and
+        joint_horizons are then not used).
+    joint_horizons : bool
+        If True, fit one multi-output model for all delta_t values instead of
+        one model per delta_t.
+    progress_callback : callable
+        If given, called as progress_callback(cells_done, cells_total) whenever
+        a column of the causal_effects matrix has been computed.
+    column_callback : callable
+        If given, called as column_callback(j, column) with the j-th column of
+        the causal_effects matrix as soon as it has been computed.
+    n_jobs : int
+        Number of threads to use for the regressions, -1 for all cores.
+    fitted_models : dict-like
+        Previously fitted models indexed by delta_t, see causal_effect_from_data_dict.
+    compact : bool
+        If True, use float32 measurements, int32 keys and categorical static
+        variables throughout, roughly halving the memory used.
+    n_sample_patients : int
+        If given, approximate the causal effects from a random sample of this
+        many patients (see sample_patients), so that the running time depends
+        on the sample size instead of the size of the cohort.
+    random_state : int
+        Seed for sampling the patients.
+    standard_errors : bool
+        If True, also estimate the standard errors of the causal effects, see
+        causal_effect_from_data_dict.
+    n_bootstrap : int
+        If positive, also compute 95% percentile bands of the causal effects
+        from at most n_bootstrap patient-level bootstrap replicates, run on
+        n_jobs worker processes (see bootstrap_causal_effect). The result then
+        has the additional keys 'lower', 'upper', and 'n_bootstrap'.
+    processes : bool
+        If True, fit the regressions for different delta_t values in worker
+        processes sharing the design matrix, see causal_effect_from_data_dict.
 
     Returns
     -------
@@ -274,6 +1133,9 @@ def compute_causal_effect(
         of this matrix.
     """
 
+    if n_sample_patients is not None:
+        data = sample_patients(data, n_sample_patients, random_state=random_state)
+
     # use max(delta_t_values) as max_delta_t
     max_delta_t = max(delta_t_values)
 
@@ -287,23 +1149,69 @@ def compute_causal_effect(
     # out of the list of parent variables, and print a warning message (but do not throw error)
     # ]
 
-    data_dict = make_data_dict(
-        data,
-        causal_graph=causal_graph,
-        markov_order=markov_order,
-        max_delta_t=max_delta_t,
-        dummies_for_categorical=False,
-    )
-
-    result_dict = causal_effect_from_data_dict(
-        data_dict,
-        causal_graph,
-        cause_variable,
-        response_variable,
-        delta_t_values,
-        intervention_values,
-        model=model,
-        dummies_for_categorical=True,
-    )
+    with observe_stage("make_data_dict"):
+        data_dict = make_data_dict(
+            data,
+            causal_graph=causal_graph,
+            markov_order=markov_order,
+            max_delta_t=max_delta_t,
+            dummies_for_categorical=False,
+            compact=compact,
+        )
+
+    # linear models are computed in closed form, which gives the same result
+    # as fitting them one delta_t at a time
+    alpha = linear_model_alpha(model)
+    if alpha is not None:
+        result_dict = linear_causal_effect_from_data_dict(
+            data_dict,
+            causal_graph,
+            cause_variable,
+            response_variable,
+            delta_t_values,
+            intervention_values,
+            alpha=alpha,
+            dummies_for_categorical=True,
+            progress_callback=progress_callback,
+            column_callback=column_callback,
+            compact=compact,
+            standard_errors=standard_errors,
+        )
+    else:
+        result_dict = causal_effect_from_data_dict(
+            data_dict,
+            causal_graph,
+            cause_variable,
+            response_variable,
+            delta_t_values,
+            intervention_values,
+            model=model,
+            dummies_for_categorical=True,
+            joint_horizons=joint_horizons,
+            progress_callback=progress_callback,
+            column_callback=column_callback,
+            n_jobs=n_jobs,
+            fitted_models=fitted_models,
+            compact=compact,
+            standard_errors=standard_errors,
+            processes=processes,
+        )
+
+    if n_bootstrap > 0:
+        with observe_stage("bootstrap"):
+            result_dict.update(bootstrap_causal_effect(
+                data_dict,
+                causal_graph,
+                cause_variable,
+                response_variable,
+                delta_t_values,
+                intervention_values,
+                model=model,
+                n_bootstrap=n_bootstrap,
+                n_jobs=n_jobs,
+                random_state=random_state,
+                dummies_for_categorical=True,
+                compact=compact,
+            ))
 
     return result_dict
@@ -0,0 +1,187 @@
+import csv
+import io
+
+import pyarrow as pa
+import pyarrow.csv as pa_csv
+import pyarrow.parquet as pq
+
+PARQUET_MAGIC = b"PAR1"
+ARROW_FILE_MAGIC = b"ARROW1"
+ARROW_STREAM_MAGIC = b"\xff\xff\xff\xff"
+
+CONTENT_HASH_KEY = b"content_hash"
+
+REQUIRED_COLUMNS = ("patient_id", "time")
+
+# size of the CSV blocks from which column types are inferred and converted
+CSV_BLOCK_SIZE = 16 << 20
+
+
+def check_required_columns(columns):
+    """
+    Raise a ValueError if any of the columns "patient_id" and "time" is missing.
+    """
+    missing = [name for name in REQUIRED_COLUMNS if name not in columns]
+    if missing:
+        raise ValueError("data does not conform to requirements: must have "
+                         + 'columns "patient_id" and "time" (missing: ' + ", ".join(missing) + ")")
+
+
+def detect_format(path: str):
+    """
+    Detect the format of an uploaded data file from its first bytes.
+
+    Returns
+    -------
+    out : str
+        One of "parquet", "arrow" (Arrow IPC file / Feather v2),
+        "arrow_stream" (Arrow IPC stream), or "csv".
+    """
+    with open(path, "rb") as infile:
+        head = infile.read(len(ARROW_FILE_MAGIC))
+
+    return detect_format_from_bytes(head)
+
+
+def detect_format_from_bytes(head: bytes):
+    """
+    Detect the format of a data file from its first bytes, see detect_format.
+    """
+    if head.startswith(PARQUET_MAGIC):
+        return "parquet"
+    elif head.startswith(ARROW_FILE_MAGIC):
+        return "arrow"
+    elif head.startswith(ARROW_STREAM_MAGIC):
+        return "arrow_stream"
+    else:
+        return "csv"
+
+
+def csv_header(head: bytes):
+    """
+    Parse the column names from the first bytes of a CSV file.
+
+    Returns
+    -------
+    out : list of str
+        The column names, or None if head does not contain the whole first line.
+    """
+    end_of_line = head.find(b"\n")
+    if end_of_line < 0:
+        return None
+    first_line = head[:end_of_line].decode("utf-8-sig").rstrip("\r")
+    return next(csv.reader(io.StringIO(first_line)))
+
+
+def read_uploaded_batches(path: str):
+    """
+    Open an uploaded CSV, Parquet or Arrow IPC file as a stream of record
+    batches, so that it can be converted without loading it into memory at
+    once. For CSV files, the column types are inferred from the first block.
+
+    Returns
+    -------
+    out : pyarrow RecordBatchReader
+    """
+    file_format = detect_format(path)
+
+    if file_format == "parquet":
+        parquet_file = pq.ParquetFile(path)
+        return pa.RecordBatchReader.from_batches(parquet_file.schema_arrow, parquet_file.iter_batches())
+    elif file_format == "arrow":
+        reader = pa.ipc.open_file(pa.memory_map(path))
+        return pa.RecordBatchReader.from_batches(
+            reader.schema, (reader.get_batch(i) for i in range(reader.num_record_batches)))
+    elif file_format == "arrow_stream":
+        return pa.ipc.open_stream(pa.memory_map(path))
+    else:
+        return pa_csv.open_csv(path, read_options=pa_csv.ReadOptions(block_size=CSV_BLOCK_SIZE))
+
+
+def read_uploaded_table(path: str):
+    """
+    Read an uploaded CSV, Parquet or Arrow IPC file into a pyarrow Table.
+    """
+    if detect_format(path) == "csv":
+        return pa_csv.read_csv(path)
+    return read_uploaded_batches(path).read_all()
+
+
+def write_dataset(data, path: str, content_hash: str):
+    """
+    Write a table or a stream of record batches to an uncompressed Arrow IPC
+    file that can be memory-mapped, recording the hash of the uploaded file in
+    the schema metadata.
+
+    Parameters
+    ----------
+    data : pyarrow Table | pyarrow RecordBatchReader
+        The data to write. A RecordBatchReader is written batch by batch.
+    path : str
+        Destination of the Arrow IPC file.
+    content_hash : str
+        Hash of the uploaded file.
+
+    Returns
+    -------
+    out : pyarrow Schema
+        The schema of the written data.
+    """
+    metadata = dict(data.schema.metadata or {})
+    metadata[CONTENT_HASH_KEY] = content_hash.encode()
+    schema = data.schema.with_metadata(metadata)
+    batches = data.to_batches() if isinstance(data, pa.Table) else data
+
+    with pa.OSFile(path, "wb") as sink:
+        with pa.ipc.new_file(sink, schema) as writer:
+            for batch in batches:
+                writer.write_batch(batch)
+
+    return schema
+
+
+def convert_upload(path: str, dest_path: str, content_hash: str):
+    """
+    Convert an uploaded file to the Arrow IPC file read by open_dataset,
+    streaming it batch by batch. If the column types inferred from the first
+    block of a CSV file do not fit a later block, read the whole file at once
+    instead.
+
+    The column types are not inferred while the upload arrives: receive_data
+    only checks the header of a CSV file during the upload, and the types are
+    inferred here, from the first block of the complete file, by the
+    streaming CSV reader of pyarrow. Converting is then a single pass over a
+    file on local disk, with the fallback above as the only second pass.
+
+    Returns
+    -------
+    out : pyarrow Schema
+        The schema of the converted data.
+    """
+    try:
+        return write_dataset(read_uploaded_batches(path), dest_path, content_hash)
+    except pa.ArrowInvalid:
+        return write_dataset(read_uploaded_table(path), dest_path, content_hash)
+
+
+def open_dataset(path: str):
+    """
+    Memory-map a dataset written by write_dataset. Columns are only read
+    from disk when they are accessed.
+
+    Returns
+    -------
+    out : tuple (pyarrow Table, str)
+        The memory-mapped table and the hash of the uploaded file.
+    """
+    source = pa.memory_map(path)
+    table = pa.ipc.open_file(source).read_all()
+    return table, dataset_hash(table)
+
+
+def dataset_hash(table):
+    """
+    Return the hash of the uploaded file stored in the schema metadata of a
+    table read with open_dataset (also after selecting columns).
+    """
+    return (table.schema.metadata or {}).get(CONTENT_HASH_KEY, b"").decode()
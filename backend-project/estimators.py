@@ -0,0 +1,97 @@
+from sklearn.ensemble import HistGradientBoostingRegressor, RandomForestRegressor
+from sklearn.linear_model import LinearRegression, Ridge
+from sklearn.multioutput import MultiOutputRegressor
+
+
+class Estimator:
+    """
+    A regression model that can be selected for computing causal effects.
+
+    Attributes
+    ----------
+    name : str
+        Name under which the estimator is selected in requests.
+    description : str
+        Speed/accuracy trade-off of the estimator, shown to users.
+    factory : callable
+        Called without arguments to create a new, unfitted model.
+    multi_output : bool
+        True if the model can fit several responses at once, as needed
+        for joint_horizons. Other models are wrapped in a MultiOutputRegressor
+        (one model per response) when several responses are fitted.
+    """
+
+    def __init__(self, name: str, description: str, factory, multi_output: bool = True):
+        """
+        Create an Estimator.
+        """
+        self.name = name
+        self.description = description
+        self.factory = factory
+        self.multi_output = multi_output
+
+
+ESTIMATORS = {estimator.name: estimator for estimator in [
+    Estimator(
+        name="random_forest",
+        description="Random forest with 100 fully grown trees. The most flexible and the "
+                    "slowest model; use it for final results.",
+        factory=lambda: RandomForestRegressor(),
+    ),
+    Estimator(
+        name="random_forest_subsampled",
+        description="Random forest with 50 trees, each grown on 10% of the rows with at "
+                    "least 5 rows per leaf. About 20 times faster than random_forest, with "
+                    "smoother (slightly more biased) effect curves; use it for exploration.",
+        factory=lambda: RandomForestRegressor(n_estimators=50, max_samples=0.1, min_samples_leaf=5),
+    ),
+    Estimator(
+        name="hist_gradient_boosting",
+        description="Gradient boosting on binned features. Captures non-linear effects "
+                    "like the forests and scales to millions of rows; about 5-10 times faster "
+                    "than random_forest, with the gap growing with the number of rows. "
+                    "Fits one model per horizon even with joint_horizons.",
+        factory=lambda: HistGradientBoostingRegressor(),
+        multi_output=False,
+    ),
+    Estimator(
+        name="ridge",
+        description="Linear regression with a small L2 penalty. Fits in well under a second "
+                    "even on large data, but only captures linear effects.",
+        factory=lambda: Ridge(alpha=1.0),
+    ),
+    Estimator(
+        name="ols",
+        description="Ordinary least squares linear regression. As fast as ridge; may be "
+                    "unstable if the adjustment variables are strongly correlated.",
+        factory=lambda: LinearRegression(),
+    ),
+]}
+
+DEFAULT_ESTIMATOR = "random_forest"
+
+
+def make_estimator(name: str = DEFAULT_ESTIMATOR, multi_output: bool = False):
+    """
+    Create a new, unfitted model from the estimator registry.
+
+    Parameters
+    ----------
+    name : str
+        Name of the estimator, one of the keys of ESTIMATORS.
+    multi_output : bool
+        If True, return a model that can fit several responses at once.
+
+    Returns
+    -------
+    model : supervised regression model satisfying sklearn API
+    """
+    if name not in ESTIMATORS:
+        raise ValueError("unknown estimator " + repr(name) + ", must be one of: "
+                         + ", ".join(ESTIMATORS))
+
+    estimator = ESTIMATORS[name]
+    model = estimator.factory()
+    if multi_output and not estimator.multi_output:
+        model = MultiOutputRegressor(model)
+    return model
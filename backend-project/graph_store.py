@@ -0,0 +1,100 @@
+import os
+
+import orjson
+
+from Graphs import GroupedCausalGraph, D2DGroupedCausalEdge
+from metrics import observe_stage
+from parseGraph import parseGroupedGraph
+
+# version of the file format written by write_graph, increased whenever
+# the format changes in a way older readers cannot handle
+GRAPH_FORMAT_VERSION = 1
+
+
+def graph_to_json(grouped_graph: GroupedCausalGraph):
+    """
+    Convert a GroupedCausalGraph to JSON in the format sent by the frontend,
+    so that parseGroupedGraph can reconstruct it. Nodes and edges keep the
+    order in which they were added to the graph.
+
+    Returns
+    -------
+    out : dict
+    """
+    def mode(group):
+        return "dynamic" if group.isDynamic() else "static"
+
+    def time_to_effect_json(time_to_effect):
+        return {"min": int(time_to_effect["min"]), "max": int(time_to_effect["max"])}
+
+    nodes = []
+    for group in grouped_graph.nodes.values():
+        edges = []
+        for edge_dict in group.graph.edges.values():
+            for edge in edge_dict.values():
+                edge_json = {"from_node": {"name": edge.from_node.name},
+                             "to_node": {"name": edge.to_node.name}}
+                if edge.time_to_effect:
+                    edge_json["time_to_effect"] = time_to_effect_json(edge.time_to_effect)
+                edges.append(edge_json)
+
+        nodes.append({"name": group.name,
+                      "mode": mode(group),
+                      "graph": {"nodes": [{"name": name} for name in group.graph.nodes],
+                                "edges": edges}})
+
+    edges = []
+    for edge_dict in grouped_graph.edges.values():
+        for edge in edge_dict.values():
+            edge_json = {"from_node": {"name": edge.from_node.name, "mode": mode(edge.from_node)},
+                         "to_node": {"name": edge.to_node.name, "mode": mode(edge.to_node)}}
+            if isinstance(edge, D2DGroupedCausalEdge):
+                edge_json["time_to_effect"] = time_to_effect_json(edge.time_to_effect)
+            edges.append(edge_json)
+
+    return {"nodes": nodes, "edges": edges}
+
+
+def write_graph(grouped_graph: GroupedCausalGraph, path: str, content_hash: str):
+    """
+    Write a GroupedCausalGraph to a versioned JSON file, recording its hash.
+    The file is written next to path first and then moved into place, so that
+    readers never see a partially written graph.
+
+    Parameters
+    ----------
+    grouped_graph : GroupedCausalGraph
+        The graph to write.
+    path : str
+        Destination of the JSON file.
+    content_hash : str
+        Hash of the graph (see caching.hash_graph).
+    """
+    document = {"format_version": GRAPH_FORMAT_VERSION,
+                "content_hash": content_hash,
+                "graph": graph_to_json(grouped_graph)}
+
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "wb") as outfile:
+        outfile.write(orjson.dumps(document))
+    os.replace(tmp_path, path)
+
+
+def load_graph(path: str):
+    """
+    Read a graph written by write_graph.
+
+    Returns
+    -------
+    out : tuple (GroupedCausalGraph, str)
+        The graph, with compiled conditioning plans, and its hash.
+    """
+    with observe_stage("load_graph"):
+        with open(path, "rb") as infile:
+            document = orjson.loads(infile.read())
+
+        if document.get("format_version") != GRAPH_FORMAT_VERSION:
+            raise ValueError("unsupported graph file format version: "
+                             + str(document.get("format_version")))
+
+        return parseGroupedGraph(document["graph"]), document["content_hash"]
@@ -0,0 +1,204 @@
+import multiprocessing
+import threading
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+
+from causal_inference import compute_causal_effect
+from data_store import open_dataset
+
+
+def run_causal_effect_job(job_id: str, progress, data_path: str, columns: list, data_hash: str, **kwargs):
+    """
+    Run compute_causal_effect in a worker process and report progress.
+
+    The data is memory-mapped from data_path in the worker instead of being
+    sent to it, so submitting a job does not copy the data.
+
+    Parameters
+    ----------
+    job_id : str
+        Identifier of the job.
+    progress : dict-like shared between processes
+        The fraction of computed cells is written to progress[job_id].
+    data_path : str
+        Path of the dataset written by data_store.write_dataset.
+    columns : list of str
+        Columns of the dataset passed on to compute_causal_effect as data.
+    data_hash : str
+        Hash of the dataset the job was submitted for. The job fails if the
+        file at data_path has been replaced since.
+    **kwargs
+        Other arguments passed on to compute_causal_effect.
+    """
+    data, current_hash = open_dataset(data_path)
+    if current_hash != data_hash:
+        raise ValueError("the data was replaced after the job was submitted")
+
+    def report_progress(cells_done, cells_total):
+        progress[job_id] = cells_done / cells_total
+
+    return compute_causal_effect(data.select(columns), progress_callback=report_progress, **kwargs)
+
+
+class Job:
+    """
+    A causal effect computation submitted to a JobManager.
+
+    Attributes
+    ----------
+    job_id : str
+        Identifier of the job.
+    future : concurrent.futures.Future
+        Future holding the result of the computation. None if the result was
+        known when the job was submitted.
+    result : dict
+        Result of the computation, once it is available.
+    created : float
+        Time at which the job was submitted.
+    """
+
+    def __init__(self, job_id: str, future=None, result: dict = None):
+        """
+        Create a Job.
+        """
+        self.job_id = job_id
+        self.future = future
+        self.result = result
+        self.created = time.time()
+
+
+class JobManager:
+    """
+    Run causal effect computations on a bounded pool of worker processes.
+
+    Jobs are kept for max_age seconds after they were submitted so that
+    clients can poll for their status and result.
+    """
+
+    def __init__(self, max_workers: int = 2, max_age: float = 60 * 60):
+        """
+        Create a JobManager. The worker processes are started on first use.
+
+        Parameters
+        ----------
+        max_workers : int
+            Maximum number of jobs running at the same time.
+        max_age : float
+            Number of seconds after which a job is forgotten.
+        """
+        self.max_workers = max_workers
+        self.max_age = max_age
+        self.jobs: dict[str, Job] = {}
+        self._executor = None
+        self._manager = None
+        self._progress = None
+        self._lock = threading.Lock()
+
+    def _start(self):
+        if self._executor is None:
+            self._manager = multiprocessing.Manager()
+            self._progress = self._manager.dict()
+            self._executor = ProcessPoolExecutor(max_workers=self.max_workers)
+
+    def submit(self, *args, on_result=None, **kwargs):
+        """
+        Submit a computation of compute_causal_effect, see
+        run_causal_effect_job for the arguments *args and **kwargs.
+
+        Parameters
+        ----------
+        on_result : callable
+            If given, called with the result dict once the job has finished.
+
+        Returns
+        -------
+        out : str
+            Identifier of the new job.
+        """
+        with self._lock:
+            self._start()
+            self._prune()
+
+            job_id = uuid.uuid4().hex
+            self._progress[job_id] = 0.0
+            future = self._executor.submit(run_causal_effect_job, job_id, self._progress, *args, **kwargs)
+            self.jobs[job_id] = Job(job_id, future=future)
+
+        if on_result:
+            future.add_done_callback(lambda f: not f.cancelled() and f.exception() is None and on_result(f.result()))
+
+        return job_id
+
+    def add_finished(self, result: dict):
+        """
+        Register a job whose result is already known (e.g. from a cache).
+
+        Returns
+        -------
+        out : str
+            Identifier of the new job.
+        """
+        with self._lock:
+            self._prune()
+            job_id = uuid.uuid4().hex
+            self.jobs[job_id] = Job(job_id, result=result)
+        return job_id
+
+    def status(self, job_id: str):
+        """
+        Return the status of a job.
+
+        Returns
+        -------
+        out : dict with keys 'status', 'progress', 'result', and 'error'
+            'status' is one of "pending", "running", "done", or "failed".
+            'progress' is the fraction of (delta_t, intervention) cells that
+            have been computed. 'result' is the result dict of a finished job
+            and 'error' the error message of a failed job, None otherwise.
+        """
+        job = self.jobs.get(job_id)
+        if job is None:
+            raise KeyError("no job with id " + job_id)
+
+        if job.future is None:
+            return {"status": "done", "progress": 1.0, "result": job.result, "error": None}
+
+        if job.future.done():
+            error = job.future.exception()
+            if error is not None:
+                return {"status": "failed", "progress": self._progress.get(job_id, 0.0),
+                        "result": None, "error": str(error)}
+            return {"status": "done", "progress": 1.0, "result": job.future.result(), "error": None}
+
+        progress = self._progress.get(job_id, 0.0)
+        return {"status": "running" if job.future.running() else "pending",
+                "progress": progress, "result": None, "error": None}
+
+    def n_active(self):
+        """
+        Return the number of jobs that are pending or running.
+        """
+        with self._lock:
+            return sum(job.future is not None and not job.future.done() for job in self.jobs.values())
+
+    def shutdown(self):
+        """
+        Cancel pending jobs and stop the worker processes.
+        """
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=False, cancel_futures=True)
+                self._manager.shutdown()
+                self._executor = None
+                self._manager = None
+                self._progress = None
+
+    def _prune(self):
+        now = time.time()
+        for job_id in [job_id for job_id, job in self.jobs.items() if now - job.created > self.max_age]:
+            job = self.jobs.pop(job_id)
+            if job.future is not None:
+                job.future.cancel()
+            if self._progress is not None:
+                self._progress.pop(job_id, None)
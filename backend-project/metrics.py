@@ -0,0 +1,106 @@
+import time
+from contextlib import contextmanager
+
+from prometheus_client import Counter, Gauge, Histogram
+from prometheus_client.core import CounterMetricFamily
+
+from tracing import current_trace
+
+# upper bounds (in seconds) of the buckets of the stage histograms, from
+# serializing a result to fitting forests on large data
+STAGE_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5,
+                 1, 2.5, 5, 10, 30, 60, 120, 300, 600)
+
+# Stages are only observed in the server process: the computations of
+# background jobs and of worker processes (bootstrap replicates, fits with
+# processes=True) are not included.
+STAGE_SECONDS = Histogram(
+    "causal_stage_duration_seconds",
+    "Duration of each stage of loading data and computing causal effects.",
+    ["stage"],
+    buckets=STAGE_BUCKETS,
+)
+
+REQUESTS = Counter(
+    "causal_http_requests",
+    "HTTP requests handled, by endpoint.",
+    ["endpoint"],
+)
+
+ERRORS = Counter(
+    "causal_http_errors",
+    "HTTP requests that failed, by endpoint and status code.",
+    ["endpoint", "status"],
+)
+
+ESTIMATIONS_IN_FLIGHT = Gauge(
+    "causal_estimations_in_flight",
+    "Causal effect computations running in the server process.",
+)
+
+ACTIVE_JOBS = Gauge(
+    "causal_jobs_active",
+    "Background causal effect jobs that are pending or running.",
+)
+
+DATASET_ROWS = Gauge(
+    "causal_dataset_rows",
+    "Number of rows of the uploaded data.",
+)
+
+DATASET_BYTES = Gauge(
+    "causal_dataset_bytes",
+    "Size of the columns of the uploaded data, in bytes.",
+)
+
+
+@contextmanager
+def observe_stage(stage: str):
+    """
+    Record the duration of the enclosed block in the histogram of stage, and
+    as a span of the current request's trace (see tracing.Trace), with its
+    peak memory if the trace records memory.
+    """
+    trace = current_trace()
+    start = time.perf_counter()
+    try:
+        if trace is not None:
+            with trace.memory_span(stage):
+                yield
+        else:
+            yield
+    finally:
+        seconds = time.perf_counter() - start
+        STAGE_SECONDS.labels(stage=stage).observe(seconds)
+
+        if trace is not None:
+            trace.add(stage, start, seconds)
+
+
+class CacheCollector:
+    """
+    Export the hit and miss counts that caches (e.g. caching.ResultCache and
+    caching.FittedModelStore) keep in their hits and misses attributes.
+    """
+
+    def __init__(self, caches: dict):
+        """
+        Create a CacheCollector.
+
+        Parameters
+        ----------
+        caches : dict
+            Maps the name used in the "cache" label to each cache.
+        """
+        self.caches = caches
+
+    def collect(self):
+        hits = CounterMetricFamily("causal_cache_hits", "Cache lookups that found an entry, by cache.",
+                                   labels=["cache"])
+        misses = CounterMetricFamily("causal_cache_misses", "Cache lookups that found no entry, by cache.",
+                                     labels=["cache"])
+        for name, cache in self.caches.items():
+            hits.add_metric([name], cache.hits)
+            misses.add_metric([name], cache.misses)
+        yield hits
+        yield misses
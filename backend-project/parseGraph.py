@@ -23,6 +23,9 @@ def parseGroupedGraph(graph_json: dict):
         else:
             grouped_graph.add_edge(parsed_edge.from_node, parsed_edge.to_node)
 
+    # precompute the conditioning plans used by the estimation requests
+    grouped_graph.compile()
+
     return grouped_graph
 
 
@@ -0,0 +1,165 @@
+import struct
+
+import numpy as np
+import orjson
+import pyarrow as pa
+from fastapi.responses import ORJSONResponse, Response
+
+JSON_MEDIA_TYPE = "application/json"
+ARROW_MEDIA_TYPE = "application/vnd.apache.arrow.stream"
+GRID_MEDIA_TYPE = "application/x-causal-effect-grid"
+
+# media types that result_response can encode, in order of preference
+RESULT_MEDIA_TYPES = (JSON_MEDIA_TYPE, ARROW_MEDIA_TYPE, GRID_MEDIA_TYPE)
+
+# matrices of a result (see compute_causal_effect), in the order in which the
+# binary encodings write them; all but causal_effects are optional
+RESULT_MATRICES = ("causal_effects", "standard_errors", "lower", "upper")
+
+# header of the grid encoding: magic bytes, format version, flags (bit i is
+# set if RESULT_MATRICES[i] follows), number of intervention values, number
+# of delta_t values and number of bootstrap replicates, all little-endian
+GRID_MAGIC = b"CEGR"
+GRID_VERSION = 1
+GRID_HEADER = struct.Struct("<4sHHIII")
+
+
+def dumps_json(content) -> bytes:
+    """
+    Serialize content to JSON with orjson, writing NumPy arrays directly.
+    NaN and infinite values, in arrays or not, become null.
+    """
+    return orjson.dumps(content, option=orjson.OPT_SERIALIZE_NUMPY)
+
+
+class NumpyJSONResponse(ORJSONResponse):
+    """
+    JSON response that may contain NumPy arrays, see dumps_json.
+    """
+
+    def render(self, content) -> bytes:
+        return dumps_json(content)
+
+
+def result_to_json(result_dict: dict):
+    """
+    Collect the output of compute_causal_effect in a dict for dumps_json. The
+    arrays are kept as they are; missing values (NaN) are sent as null.
+    """
+    result_json = {key: np.ascontiguousarray(result_dict[key])
+                   for key in ("intervention", "delta_t") + RESULT_MATRICES if key in result_dict}
+    if "n_bootstrap" in result_dict:
+        result_json["n_bootstrap"] = int(result_dict["n_bootstrap"])
+    return result_json
+
+
+def result_to_arrow(result_dict: dict, metadata: dict = None) -> bytes:
+    """
+    Encode the output of compute_causal_effect as an Arrow IPC stream with one
+    record batch in long format: one row per (intervention, delta_t) pair, in
+    row-major order of the matrices, with the columns "intervention",
+    "delta_t" and one column per matrix in the result. Missing values are
+    nulls. The number of bootstrap replicates, if any, and the entries of
+    metadata (serialized to JSON) are stored in the schema metadata.
+    """
+    intervention_values = np.asarray(result_dict["intervention"], dtype=np.float64)
+    delta_t_values = np.asarray(result_dict["delta_t"], dtype=np.int64)
+
+    columns = {
+        "intervention": pa.array(np.repeat(intervention_values, len(delta_t_values))),
+        "delta_t": pa.array(np.tile(delta_t_values, len(intervention_values))),
+    }
+    for key in RESULT_MATRICES:
+        if key in result_dict:
+            columns[key] = pa.array(np.ravel(result_dict[key]).astype(np.float64, copy=False), from_pandas=True)
+
+    schema_metadata = {key: dumps_json(value) for key, value in (metadata or {}).items()}
+    if "n_bootstrap" in result_dict:
+        schema_metadata["n_bootstrap"] = str(int(result_dict["n_bootstrap"]))
+
+    batch = pa.RecordBatch.from_arrays(list(columns.values()), names=list(columns))
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, batch.schema.with_metadata(schema_metadata)) as writer:
+        writer.write_batch(batch)
+    return sink.getvalue().to_pybytes()
+
+
+def result_to_grid(result_dict: dict) -> bytes:
+    """
+    Encode the output of compute_causal_effect as raw little-endian arrays:
+    a GRID_HEADER, the intervention values (float32), the delta_t values
+    (int32), and the matrices named in the header flags (float32, row-major,
+    one row per intervention value). Missing values are NaN. All parts start
+    at multiples of 4 bytes, so that they can be read as typed arrays.
+    """
+    intervention_values = np.asarray(result_dict["intervention"])
+    delta_t_values = np.asarray(result_dict["delta_t"])
+    keys = [key for key in RESULT_MATRICES if key in result_dict]
+    flags = sum(1 << i for i, key in enumerate(RESULT_MATRICES) if key in result_dict)
+
+    header = GRID_HEADER.pack(GRID_MAGIC, GRID_VERSION, flags, len(intervention_values),
+                              len(delta_t_values), int(result_dict.get("n_bootstrap", 0)))
+    parts = [header,
+             intervention_values.astype("<f4").tobytes(),
+             delta_t_values.astype("<i4").tobytes()]
+    parts += [np.asarray(result_dict[key]).astype("<f4").tobytes() for key in keys]
+    return b"".join(parts)
+
+
+def negotiate(accept: str = None):
+    """
+    Choose the media type of a result from the Accept header of a request.
+
+    Returns
+    -------
+    out : str
+        The supported media type (see RESULT_MEDIA_TYPES) with the highest
+        quality value in accept; JSON_MEDIA_TYPE if accept is empty or names
+        none of them.
+    """
+    best, best_quality = JSON_MEDIA_TYPE, 0.0
+    for media_range in (accept or "").split(","):
+        media_type, *params = [part.strip() for part in media_range.split(";")]
+        quality = 1.0
+        for param in params:
+            name, _, value = param.partition("=")
+            if name.strip() == "q":
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        if media_type in RESULT_MEDIA_TYPES and quality > best_quality:
+            best, best_quality = media_type, quality
+    return best
+
+
+def result_response(result_dict: dict, accept: str = None, extra: dict = None):
+    """
+    Encode the output of compute_causal_effect in the media type negotiated
+    from the Accept header accept.
+
+    Parameters
+    ----------
+    result_dict : dict
+        Output of compute_causal_effect.
+    accept : str
+        The Accept header of the request.
+    extra : dict
+        Additional fields (e.g. timings), added to the JSON object or to the
+        Arrow schema metadata; not sent in the grid encoding.
+
+    Returns
+    -------
+    out : starlette Response
+    """
+    # the body depends on the Accept header, which caches must take into account
+    headers = {"Vary": "Accept"}
+    media_type = negotiate(accept)
+    if media_type == ARROW_MEDIA_TYPE:
+        return Response(result_to_arrow(result_dict, extra), media_type=ARROW_MEDIA_TYPE, headers=headers)
+    if media_type == GRID_MEDIA_TYPE:
+        return Response(result_to_grid(result_dict), media_type=GRID_MEDIA_TYPE, headers=headers)
+
+    result_json = result_to_json(result_dict)
+    result_json.update(extra or {})
+    return NumpyJSONResponse(result_json, headers=headers)
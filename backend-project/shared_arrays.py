@@ -0,0 +1,80 @@
+from multiprocessing import shared_memory
+
+import numpy as np
+
+# shared memory blocks attached by attach_arrays in this process, kept open
+# for as long as the process may use the arrays
+_attached = []
+
+
+class SharedArrays:
+    """
+    NumPy arrays placed in shared memory blocks, so that worker processes can
+    use them without receiving a copy.
+
+    Use as a context manager: the blocks are removed when the context exits,
+    also if an exception was raised. Pass handles to the workers (e.g. through
+    the initializer of a process pool) and call attach_arrays there.
+
+    Attributes
+    ----------
+    handles : dict[str, tuple (str, tuple, str)]
+        Maps the name of each array to the name of its shared memory block,
+        its shape and its dtype.
+    """
+
+    def __init__(self, **arrays):
+        """
+        Copy the given arrays (passed as keyword arguments) to shared memory.
+        """
+        self.handles = {}
+        self._blocks = []
+        try:
+            for name, array in arrays.items():
+                array = np.ascontiguousarray(array)
+                block = shared_memory.SharedMemory(create=True, size=max(array.nbytes, 1))
+                self._blocks.append(block)
+                np.ndarray(array.shape, dtype=array.dtype, buffer=block.buf)[...] = array
+                self.handles[name] = (block.name, array.shape, array.dtype.str)
+        except BaseException:
+            self.close()
+            raise
+
+    def close(self):
+        """
+        Release and remove the shared memory blocks.
+        """
+        for block in self._blocks:
+            block.close()
+            block.unlink()
+        self._blocks = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def attach_arrays(handles: dict):
+    """
+    Attach to arrays created by SharedArrays, e.g. in a worker process.
+
+    Parameters
+    ----------
+    handles : dict
+        The handles attribute of a SharedArrays object.
+
+    Returns
+    -------
+    out : dict[str, NumPy array]
+        Read-only views of the shared arrays.
+    """
+    arrays = {}
+    for name, (block_name, shape, dtype) in handles.items():
+        block = shared_memory.SharedMemory(name=block_name)
+        _attached.append(block)
+        array = np.ndarray(shape, dtype=np.dtype(dtype), buffer=block.buf)
+        array.flags.writeable = False
+        arrays[name] = array
+    return arrays
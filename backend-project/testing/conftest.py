@@ -0,0 +1,5 @@
+import os
+import sys
+
+# the backend modules are imported by name, as when running from backend-project
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
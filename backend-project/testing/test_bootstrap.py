@@ -0,0 +1,62 @@
+import numpy as np
+import pytest
+from sklearn.linear_model import Ridge
+
+from benchmarks.synthetic import make_graph_json, make_panel, cause_and_response
+from causal_inference import bootstrap_causal_effect, compute_causal_effect, make_data_dict
+from parseGraph import parseGroupedGraph
+
+
+@pytest.fixture(scope="module")
+def problem():
+    graph_json = make_graph_json(n_dynamic=4, n_static=1, density=0.5, max_time_to_effect=2, random_state=0)
+    panel = make_panel(graph_json, n_patients=30, n_timesteps=15, random_state=0)
+    cause, response = cause_and_response(graph_json)
+    graph = parseGroupedGraph(graph_json)
+    delta_t_values = np.arange(1, 3)
+    data_dict = make_data_dict(panel, causal_graph=graph, markov_order=graph.max_time_to_effect,
+                               max_delta_t=delta_t_values.max())
+    return {"panel": panel, "data_dict": data_dict, "causal_graph": graph, "cause_variable": cause,
+            "response_variable": response, "delta_t_values": delta_t_values,
+            "intervention_values": np.linspace(-1, 1, 3)}
+
+
+def bootstrap(problem, **kwargs):
+    return bootstrap_causal_effect(
+        problem["data_dict"], problem["causal_graph"], problem["cause_variable"], problem["response_variable"],
+        problem["delta_t_values"], problem["intervention_values"], Ridge(), random_state=0, **kwargs)
+
+
+def test_stops_early_once_the_bands_are_stable(problem):
+    # the first check only records the bands, the second one can stop
+    stopped = bootstrap(problem, n_bootstrap=100, min_bootstrap=20, check_every=10, tolerance=10.0)
+    assert stopped["n_bootstrap"] == 30
+
+    full = bootstrap(problem, n_bootstrap=40, min_bootstrap=20, check_every=10, tolerance=0.0)
+    assert full["n_bootstrap"] == 40
+    assert np.all(full["lower"] <= full["upper"])
+
+
+def test_bands_do_not_depend_on_the_number_of_workers(problem):
+    kwargs = {"n_bootstrap": 60, "min_bootstrap": 20, "check_every": 5, "tolerance": 0.05}
+    serial = bootstrap(problem, n_jobs=1, **kwargs)
+    parallel = bootstrap(problem, n_jobs=3, **kwargs)
+
+    assert serial["n_bootstrap"] == parallel["n_bootstrap"]
+    np.testing.assert_array_equal(serial["lower"], parallel["lower"])
+    np.testing.assert_array_equal(serial["upper"], parallel["upper"])
+
+
+def test_compute_causal_effect_adds_bands(problem):
+    result = compute_causal_effect(
+        problem["panel"], problem["causal_graph"], problem["cause_variable"], problem["response_variable"],
+        problem["delta_t_values"], problem["intervention_values"], model=Ridge(), n_bootstrap=20,
+        random_state=0)
+
+    assert result["lower"].shape == result["upper"].shape == result["causal_effects"].shape
+    assert 1 <= result["n_bootstrap"] <= 20
+
+
+def test_needs_a_replicate(problem):
+    with pytest.raises(ValueError):
+        bootstrap(problem, n_bootstrap=0)
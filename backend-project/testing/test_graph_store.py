@@ -0,0 +1,66 @@
+import os
+import pickle
+
+import orjson
+import pytest
+
+from benchmarks.synthetic import make_graph_json
+from caching import GraphCache, hash_graph
+from graph_store import GRAPH_FORMAT_VERSION, graph_to_json, write_graph, load_graph
+from parseGraph import parseGroupedGraph
+
+
+def conditioning_plans(graph):
+    plans = {}
+    for name in graph.getVariableNames():
+        plan = graph.getConditioningPlan(name)
+        plans[name] = (plan.static_parents, plan.dynamic_parents)
+    return plans
+
+
+def test_write_and_load_graph(tmp_path):
+    graph = parseGroupedGraph(make_graph_json(n_dynamic=7, n_static=2, density=0.5, random_state=0))
+    path = str(tmp_path / "graph.json")
+    write_graph(graph, path, hash_graph(graph))
+    assert os.listdir(tmp_path) == ["graph.json"]
+
+    loaded, content_hash = load_graph(path)
+    assert content_hash == hash_graph(graph) == hash_graph(loaded)
+    assert graph_to_json(loaded) == graph_to_json(graph)
+    assert loaded.max_time_to_effect == graph.max_time_to_effect
+    assert conditioning_plans(loaded) == conditioning_plans(graph)
+
+
+def test_load_graph_rejects_other_format_versions(tmp_path):
+    graph = parseGroupedGraph(make_graph_json(random_state=1))
+    path = str(tmp_path / "graph.json")
+    write_graph(graph, path, hash_graph(graph))
+
+    with open(path, "rb") as infile:
+        document = orjson.loads(infile.read())
+    for version in (GRAPH_FORMAT_VERSION + 1, None):
+        document["format_version"] = version
+        with open(path, "wb") as outfile:
+            outfile.write(orjson.dumps(document))
+        with pytest.raises(ValueError, match="format version"):
+            load_graph(path)
+
+
+def test_hash_graph_ignores_insertion_order():
+    graph_json = make_graph_json(n_dynamic=7, n_static=2, density=0.5, random_state=2)
+    reordered = {"nodes": graph_json["nodes"][::-1], "edges": graph_json["edges"][::-1]}
+    assert hash_graph(parseGroupedGraph(reordered)) == hash_graph(parseGroupedGraph(graph_json))
+
+
+def test_graph_cache_reads_the_file_once(tmp_path):
+    graph = parseGroupedGraph(make_graph_json(random_state=3))
+    path = str(tmp_path / "graph.json")
+    write_graph(graph, path, hash_graph(graph))
+
+    cache = GraphCache()
+    cached, content_hash = cache.get(path)
+    os.remove(path)
+    assert cache.get(path) == (cached, content_hash)
+
+    # a pickled copy keeps the compiled plans
+    assert conditioning_plans(pickle.loads(pickle.dumps(cached))) == conditioning_plans(cached)
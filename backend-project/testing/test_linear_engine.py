@@ -0,0 +1,103 @@
+import numpy as np
+import pytest
+from sklearn.linear_model import LinearRegression, Ridge
+
+import causal_inference
+from benchmarks.synthetic import make_graph_json, make_panel, cause_and_response
+from causal_inference import linear_fit, linear_effects, linear_model_alpha, \
+    linear_causal_effect_from_data_dict, causal_effect_from_data_dict, make_data_dict, design_matrix
+from parseGraph import parseGroupedGraph
+
+
+def regression_data(n_samples=500, n_features=6, n_responses=3, seed=0):
+    """
+    Features with different offsets and scales and responses that depend
+    linearly on them, plus noise.
+    """
+    rng = np.random.default_rng(seed)
+    X = rng.normal(size=(n_samples, n_features)) * rng.uniform(0.5, 2, n_features) + rng.uniform(-3, 3, n_features)
+    Y = X @ rng.normal(size=(n_features, n_responses)) + rng.normal(size=(n_samples, n_responses)) + 1.0
+    return X, Y
+
+
+def sklearn_effects(model, X, Y, intervention_values):
+    """
+    Mean predictions of model, fitted per column of Y, with the last column of
+    X set to each intervention value.
+    """
+    effects = np.zeros((len(intervention_values), Y.shape[1]))
+    for j in range(Y.shape[1]):
+        fitted = model.fit(X, Y[:, j])
+        for i, value in enumerate(intervention_values):
+            X_intervention = X.copy()
+            X_intervention[:, -1] = value
+            effects[i, j] = fitted.predict(X_intervention).mean()
+    return effects
+
+
+@pytest.mark.parametrize("model", [LinearRegression(), Ridge(alpha=0.5), Ridge(alpha=20.0)])
+@pytest.mark.parametrize("block_rows", [causal_inference.LINEAR_BLOCK_ROWS, 64])
+def test_linear_engine_matches_sklearn(model, block_rows, monkeypatch):
+    monkeypatch.setattr(causal_inference, "LINEAR_BLOCK_ROWS", block_rows)
+    X, Y = regression_data()
+    intervention_values = np.linspace(-2, 5, 7)
+
+    coefficients, X_mean, Y_mean = linear_fit(X, Y, alpha=linear_model_alpha(model))
+    for j in range(Y.shape[1]):
+        fitted = model.fit(X, Y[:, j])
+        np.testing.assert_allclose(coefficients[:, j], fitted.coef_, rtol=1e-12, atol=1e-12)
+        np.testing.assert_allclose(Y_mean[j] - X_mean @ coefficients[:, j], fitted.intercept_,
+                                   rtol=1e-12, atol=1e-12)
+
+    np.testing.assert_allclose(linear_effects(coefficients, X_mean, Y_mean, intervention_values),
+                               sklearn_effects(model, X, Y, intervention_values), rtol=1e-12, atol=1e-12)
+
+
+def test_linear_model_alpha():
+    assert linear_model_alpha(LinearRegression()) == 0.0
+    assert linear_model_alpha(Ridge(alpha=2.0)) == 2.0
+    assert linear_model_alpha(LinearRegression(fit_intercept=False)) is None
+    assert linear_model_alpha(Ridge(alpha=[1.0, 2.0])) is None
+
+
+@pytest.mark.parametrize("model", [LinearRegression(), Ridge(alpha=1.0)])
+def test_linear_causal_effect_matches_generic_path(model):
+    graph_json = make_graph_json(n_dynamic=5, n_static=2, density=0.4, max_time_to_effect=2, random_state=0)
+    panel = make_panel(graph_json, n_patients=40, n_timesteps=25, random_state=0)
+    cause, response = cause_and_response(graph_json)
+    graph = parseGroupedGraph(graph_json)
+    delta_t_values = np.arange(1, 4)
+    intervention_values = np.linspace(-1, 1, 5)
+
+    data_dict = make_data_dict(panel, causal_graph=graph, markov_order=graph.max_time_to_effect,
+                               max_delta_t=delta_t_values.max())
+    linear = linear_causal_effect_from_data_dict(data_dict, graph, cause, response, delta_t_values,
+                                                 intervention_values, alpha=linear_model_alpha(model))
+    generic = causal_effect_from_data_dict(data_dict, graph, cause, response, delta_t_values,
+                                           intervention_values, model=model)
+    np.testing.assert_allclose(linear["causal_effects"], generic["causal_effects"], rtol=1e-10, atol=1e-12)
+
+
+def test_cause_without_static_parents():
+    graph_json = make_graph_json(n_dynamic=5, n_static=2, density=0.4, max_time_to_effect=2, random_state=0)
+    panel = make_panel(graph_json, n_patients=40, n_timesteps=25, random_state=0)
+    cause, response = cause_and_response(graph_json)
+    # keep the static variables in the graph and the data, but not as parents
+    graph_json["edges"] = [edge for edge in graph_json["edges"] if edge["from_node"]["mode"] != "static"]
+    graph = parseGroupedGraph(graph_json)
+    delta_t_values = np.arange(1, 3)
+    intervention_values = np.linspace(-1, 1, 3)
+
+    data_dict = make_data_dict(panel, causal_graph=graph, markov_order=graph.max_time_to_effect,
+                               max_delta_t=delta_t_values.max())
+    assert data_dict["static"] is not None
+    assert graph.getConditioningPlan(cause).static_parents == []
+
+    X = design_matrix(data_dict, graph, cause)
+    assert X.shape[1] == len(graph.getConditioningPlan(cause).dynamic_parents) + 1
+
+    linear = linear_causal_effect_from_data_dict(data_dict, graph, cause, response, delta_t_values,
+                                                 intervention_values)
+    generic = causal_effect_from_data_dict(data_dict, graph, cause, response, delta_t_values,
+                                           intervention_values, model=LinearRegression())
+    np.testing.assert_allclose(linear["causal_effects"], generic["causal_effects"], rtol=1e-10, atol=1e-12)
@@ -0,0 +1,73 @@
+import numpy as np
+from sklearn.ensemble import RandomForestRegressor
+
+from benchmarks.synthetic import make_graph_json, make_panel, cause_and_response
+from caching import FittedModelStore, estimate_model_size
+from causal_inference import compute_causal_effect
+from parseGraph import parseGroupedGraph
+
+
+def fitted_forest(n_estimators=3, seed=0):
+    rng = np.random.default_rng(seed)
+    X = rng.normal(size=(200, 4))
+    return RandomForestRegressor(n_estimators=n_estimators, random_state=seed).fit(X, X[:, 0])
+
+
+def test_evicts_by_model_size():
+    model = fitted_forest()
+    size = estimate_model_size(model)
+    store = FittedModelStore(max_bytes=2 * size)
+    store.put("a", model)
+    store.put("b", fitted_forest())
+    store.get("a")
+    store.put("c", fitted_forest())
+
+    assert store.total_bytes <= 2 * size
+    assert store.get("b") is None
+    assert store.get("a") is model
+    assert store.get("c") is not None
+
+
+def test_does_not_store_models_over_budget():
+    model = fitted_forest()
+    store = FittedModelStore(max_bytes=estimate_model_size(model) - 1)
+    store.put("a", model)
+    assert store.get("a") is None
+    assert store.total_bytes == 0
+
+
+def test_views_are_keyed_by_problem_and_delta_t():
+    store = FittedModelStore()
+    model = fitted_forest()
+    view = store.view("data", "graph", "cause", "response", "model", False, None, 3)
+    view[1] = model
+    view[(1, 2, 3)] = model
+
+    assert view.get(np.int64(1)) is model
+    assert view.get(np.array([1, 2, 3])) is model
+    assert view.get(2) is None
+    # models fitted up to another largest delta_t were fitted on other rows
+    assert store.view("data", "graph", "cause", "response", "model", False, None, 5).get(1) is None
+
+
+def test_stored_models_give_the_same_effects():
+    graph_json = make_graph_json(n_dynamic=4, n_static=0, density=0.5, max_time_to_effect=2, random_state=0)
+    panel = make_panel(graph_json, n_patients=20, n_timesteps=20, random_state=0)
+    cause, response = cause_and_response(graph_json)
+    graph = parseGroupedGraph(graph_json)
+    store = FittedModelStore()
+    delta_t_values = np.arange(1, 4)
+
+    def estimate(intervention_values, view):
+        return compute_causal_effect(panel, graph, cause, response, delta_t_values, intervention_values,
+                                     model=RandomForestRegressor(n_estimators=5, random_state=0),
+                                     fitted_models=view)["causal_effects"]
+
+    view = store.view("panel", "graph", 3)
+    first = estimate(np.linspace(-1, 1, 3), view)
+    assert (store.hits, store.misses) == (0, 3)
+
+    # a finer intervention grid reuses the three models
+    finer = estimate(np.linspace(-1, 1, 5), store.view("panel", "graph", 3))
+    assert store.hits == 3
+    np.testing.assert_array_equal(finer[::2], first)
@@ -0,0 +1,71 @@
+import os
+
+import numpy as np
+
+import caching
+from caching import ResultCache
+
+
+def make_result(value: float):
+    return {"intervention": np.arange(3.0), "delta_t": np.arange(1, 3),
+            "causal_effects": np.full((3, 2), value)}
+
+
+def test_make_key():
+    key = ResultCache.make_key("data", "graph", np.arange(3), [1, 2], 0.5, None)
+    assert key == ResultCache.make_key("data", "graph", [0, 1, 2], (1, 2), 0.5, None)
+    assert key != ResultCache.make_key("data", "graph", np.arange(4), [1, 2], 0.5, None)
+    assert key != ResultCache.make_key("graph", "data", np.arange(3), [1, 2], 0.5, None)
+
+
+def test_hit_and_miss():
+    cache = ResultCache(max_entries=4)
+    assert cache.get("a") is None
+    cache.put("a", make_result(1.0))
+    assert cache.get("a")["causal_effects"][0, 0] == 1.0
+    assert (cache.hits, cache.misses) == (1, 1)
+
+
+def test_evicts_least_recently_used():
+    cache = ResultCache(max_entries=2)
+    cache.put("a", make_result(1.0))
+    cache.put("b", make_result(2.0))
+    cache.get("a")
+    cache.put("c", make_result(3.0))
+
+    assert cache.get("b") is None
+    assert cache.get("a") is not None
+    assert cache.get("c") is not None
+
+
+def test_spills_evicted_results(tmp_path):
+    cache = ResultCache(max_entries=1, spill_dir=str(tmp_path))
+    result = make_result(1.0)
+    result["causal_effects"][1, 1] = np.nan
+    cache.put("a", result)
+    cache.put("b", make_result(2.0))
+    assert os.listdir(tmp_path) == ["a.npz"]
+
+    # reading a spilled result back moves it into memory and spills "b"
+    spilled = cache.get("a")
+    np.testing.assert_array_equal(spilled["causal_effects"], result["causal_effects"])
+    np.testing.assert_array_equal(spilled["delta_t"], result["delta_t"])
+    assert os.listdir(tmp_path) == ["b.npz"]
+    assert cache.get("b")["causal_effects"][0, 0] == 2.0
+
+    cache.clear()
+    assert os.listdir(tmp_path) == []
+    assert cache.get("a") is None
+
+
+def test_expires_results(tmp_path, monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(caching.time, "time", lambda: now[0])
+    cache = ResultCache(max_entries=1, max_age=10, spill_dir=str(tmp_path))
+    cache.put("a", make_result(1.0))
+    cache.put("b", make_result(2.0))
+
+    now[0] += 11
+    assert cache.get("a") is None
+    assert cache.get("b") is None
+    assert os.listdir(tmp_path) == []
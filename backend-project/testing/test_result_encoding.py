@@ -0,0 +1,84 @@
+import numpy as np
+import orjson
+import pyarrow as pa
+
+from result_encoding import (ARROW_MEDIA_TYPE, GRID_HEADER, GRID_MAGIC, GRID_MEDIA_TYPE, GRID_VERSION,
+                             JSON_MEDIA_TYPE, dumps_json, negotiate, result_response, result_to_arrow,
+                             result_to_grid, result_to_json)
+
+
+def make_result():
+    causal_effects = np.arange(6.0).reshape(3, 2)
+    causal_effects[1, 0] = np.nan
+    return {"intervention": np.linspace(-1, 1, 3), "delta_t": np.array([1, 3]),
+            "causal_effects": causal_effects, "lower": causal_effects - 1, "upper": causal_effects + 1,
+            "n_bootstrap": 50}
+
+
+def test_negotiate():
+    assert negotiate(None) == JSON_MEDIA_TYPE
+    assert negotiate("text/html, */*") == JSON_MEDIA_TYPE
+    assert negotiate(ARROW_MEDIA_TYPE) == ARROW_MEDIA_TYPE
+    assert negotiate(f"{JSON_MEDIA_TYPE};q=0.5, {GRID_MEDIA_TYPE}") == GRID_MEDIA_TYPE
+    assert negotiate(f"{ARROW_MEDIA_TYPE};q=0.9, {GRID_MEDIA_TYPE};q=0.8") == ARROW_MEDIA_TYPE
+    assert negotiate(f"{ARROW_MEDIA_TYPE};q=bad") == JSON_MEDIA_TYPE
+
+
+def test_json_sends_nan_as_null():
+    decoded = orjson.loads(dumps_json(result_to_json(make_result())))
+    assert decoded["causal_effects"] == [[0.0, 1.0], [None, 3.0], [4.0, 5.0]]
+    assert decoded["delta_t"] == [1, 3]
+    assert decoded["n_bootstrap"] == 50
+    assert "standard_errors" not in decoded
+
+
+def test_arrow_round_trip():
+    result = make_result()
+    reader = pa.ipc.open_stream(result_to_arrow(result, {"timings": {"fit": 0.5}}))
+    table = reader.read_all()
+
+    assert table.column_names == ["intervention", "delta_t", "causal_effects", "lower", "upper"]
+    assert table.column("intervention").to_pylist() == [-1.0, -1.0, 0.0, 0.0, 1.0, 1.0]
+    assert table.column("delta_t").to_pylist() == [1, 3, 1, 3, 1, 3]
+    # row-major order of the matrix, with nulls for NaN
+    assert table.column("causal_effects").to_pylist() == [0.0, 1.0, None, 3.0, 4.0, 5.0]
+    assert table.column("upper").null_count == 1
+
+    metadata = table.schema.metadata
+    assert metadata[b"n_bootstrap"] == b"50"
+    assert orjson.loads(metadata[b"timings"]) == {"fit": 0.5}
+
+
+def test_grid_round_trip():
+    result = make_result()
+    body = result_to_grid(result)
+
+    assert GRID_HEADER.size == 20
+    magic, version, flags, n_intervention, n_delta_t, n_bootstrap = GRID_HEADER.unpack_from(body)
+    assert (magic, version) == (GRID_MAGIC, GRID_VERSION)
+    # causal_effects, lower and upper, but no standard_errors
+    assert flags == 0b1101
+    assert (n_intervention, n_delta_t, n_bootstrap) == (3, 2, 50)
+
+    offset = GRID_HEADER.size
+    intervention = np.frombuffer(body, dtype="<f4", count=n_intervention, offset=offset)
+    offset += intervention.nbytes
+    delta_t = np.frombuffer(body, dtype="<i4", count=n_delta_t, offset=offset)
+    offset += delta_t.nbytes
+    np.testing.assert_array_equal(intervention, result["intervention"].astype(np.float32))
+    np.testing.assert_array_equal(delta_t, result["delta_t"])
+
+    for key in ("causal_effects", "lower", "upper"):
+        matrix = np.frombuffer(body, dtype="<f4", count=n_intervention * n_delta_t, offset=offset)
+        offset += matrix.nbytes
+        np.testing.assert_array_equal(matrix.reshape(n_intervention, n_delta_t),
+                                      result[key].astype(np.float32))
+    assert offset == len(body)
+
+
+def test_responses_vary_on_accept():
+    for accept, media_type in ((None, JSON_MEDIA_TYPE), (ARROW_MEDIA_TYPE, ARROW_MEDIA_TYPE),
+                               (GRID_MEDIA_TYPE, GRID_MEDIA_TYPE)):
+        response = result_response(make_result(), accept, extra={"timings": {}})
+        assert response.headers["vary"] == "Accept"
+        assert response.headers["content-type"].startswith(media_type)
@@ -0,0 +1,58 @@
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+
+import numpy as np
+import pytest
+from sklearn.ensemble import RandomForestRegressor
+
+from benchmarks.synthetic import make_graph_json, make_panel, cause_and_response
+from causal_inference import compute_causal_effect
+from parseGraph import parseGroupedGraph
+from shared_arrays import SharedArrays, attach_arrays
+
+
+def attached_sums(handles):
+    arrays = attach_arrays(handles)
+    return {name: array.sum() for name, array in arrays.items()}
+
+
+def test_attached_arrays_are_read_only_copies():
+    X = np.arange(12.0).reshape(3, 4)
+    codes = np.array([3, 1, 2], dtype=np.int32)
+    with SharedArrays(X=X, codes=codes, empty=np.empty(0)) as shared:
+        arrays = attach_arrays(shared.handles)
+        np.testing.assert_array_equal(arrays["X"], X)
+        assert arrays["codes"].dtype == np.int32
+        assert arrays["empty"].shape == (0,)
+        with pytest.raises(ValueError):
+            arrays["X"][0, 0] = 1.0
+
+        with ProcessPoolExecutor(max_workers=1) as executor:
+            sums = executor.submit(attached_sums, shared.handles).result()
+        assert sums == {"X": X.sum(), "codes": codes.sum(), "empty": 0.0}
+
+
+def test_blocks_are_removed_on_exit():
+    with pytest.raises(RuntimeError):
+        with SharedArrays(X=np.ones(5)) as shared:
+            block_name = shared.handles["X"][0]
+            raise RuntimeError
+    with pytest.raises(FileNotFoundError):
+        shared_memory.SharedMemory(name=block_name)
+
+
+def test_processes_give_the_same_effects():
+    graph_json = make_graph_json(n_dynamic=4, n_static=1, density=0.5, max_time_to_effect=2, random_state=0)
+    panel = make_panel(graph_json, n_patients=20, n_timesteps=15, random_state=0)
+    cause, response = cause_and_response(graph_json)
+    graph = parseGroupedGraph(graph_json)
+
+    def estimate(**kwargs):
+        return compute_causal_effect(panel, graph, cause, response, np.arange(1, 4), np.linspace(-1, 1, 3),
+                                     model=RandomForestRegressor(n_estimators=5, random_state=0),
+                                     standard_errors=True, **kwargs)
+
+    serial = estimate()
+    shared = estimate(n_jobs=2, processes=True)
+    np.testing.assert_array_equal(shared["causal_effects"], serial["causal_effects"])
+    np.testing.assert_array_equal(shared["standard_errors"], serial["standard_errors"])
@@ -0,0 +1,57 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from causal_inference import shift_within_patients, markov_transform
+
+
+def ragged_panel(n_patients=30, max_timesteps=12, dtype=np.float64, seed=0):
+    """
+    Panel of patients with 1 to max_timesteps rows each, non-consecutive
+    patient ids and times, missing values, and the rows in random order.
+    """
+    rng = np.random.default_rng(seed)
+    lengths = rng.integers(1, max_timesteps + 1, size=n_patients)
+    patient_ids = np.repeat(rng.choice(10 * n_patients, size=n_patients, replace=False), lengths)
+    times = np.concatenate([np.sort(rng.choice(3 * max_timesteps, size=n, replace=False)) for n in lengths])
+
+    df = pd.DataFrame({
+        "patient_id": patient_ids,
+        "time": times,
+        "a": rng.normal(size=len(times)).astype(dtype),
+        "b": rng.normal(size=len(times)).astype(dtype),
+    })
+    df.loc[rng.random(len(df)) < 0.1, "b"] = np.nan
+    return df.sample(frac=1, random_state=seed).set_index(["patient_id", "time"])
+
+
+def groupby_shift(df, shift):
+    """
+    Shift the rows of each patient, ordered by time, with pandas (the way
+    markov_transform used to), aligned with the rows of df.
+    """
+    return df.sort_index().groupby(level="patient_id").shift(shift).reindex(df.index)
+
+
+@pytest.mark.parametrize("dtype", [np.float64, np.float32])
+@pytest.mark.parametrize("seed", [0, 1, 2])
+def test_shift_within_patients_matches_groupby_shift(dtype, seed):
+    df = ragged_panel(dtype=dtype, seed=seed)
+    shifts = [1, 2, 5, 13, -1, -3, -13]
+    shifted = shift_within_patients(df, shifts)
+
+    for shift in shifts:
+        assert shifted[shift].shape == df.shape
+        assert shifted[shift].dtype == dtype
+        np.testing.assert_array_equal(shifted[shift], groupby_shift(df, shift).to_numpy(dtype=dtype))
+
+
+def test_markov_transform_columns():
+    df = ragged_panel(seed=3)
+    past_df, present_df, future_df = markov_transform(df, order=2, max_delta_t=2)
+
+    assert list(past_df.columns) == ["a_tm1", "b_tm1", "a_tm2", "b_tm2"]
+    assert list(future_df.columns) == ["a_tp2", "b_tp2", "a_tp1", "b_tp1"]
+    assert past_df.index.equals(df.index) and future_df.index.equals(df.index)
+    np.testing.assert_array_equal(past_df["b_tm2"], groupby_shift(df, 2)["b"])
+    np.testing.assert_array_equal(future_df["a_tp1"], groupby_shift(df, -1)["a"])
@@ -0,0 +1,186 @@
+import cProfile
+import logging
+import os
+import threading
+import time
+import tracemalloc
+import uuid
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+logger = logging.getLogger(__name__)
+
+# trace of the request handled in the current context, see start_trace
+_current_trace: ContextVar = ContextVar("current_trace", default=None)
+
+# spans of Trace.memory_span open in each thread, of any trace: the peak that
+# tracemalloc reports is shared by all of them
+_memory_spans = threading.local()
+
+
+class Trace:
+    """
+    The stages recorded while handling one request.
+
+    Stages run in threads started by the request (e.g. parallel fits) are
+    only recorded if the thread runs in a copy of the request's context
+    (see contextvars.copy_context).
+
+    Attributes
+    ----------
+    trace_id : str
+        Identifier of the request, also used in the name of its profile.
+    spans : list of tuple (str, float, float)
+        The name, start (in seconds since the trace started) and duration of
+        each recorded stage, in the order in which they finished.
+    profile_path : str
+        Path of the profile written for the request, if it was profiled.
+    trace_memory : bool
+        If True, memory_span records the peak memory of each stage.
+    peak_bytes : dict[str, int]
+        Maps each stage to the largest peak memory recorded for it by
+        memory_span, in bytes above the memory in use when it started.
+    """
+
+    def __init__(self, trace_memory: bool = False):
+        """
+        Create an empty Trace, starting now.
+        """
+        self.trace_id = uuid.uuid4().hex
+        self.start = time.perf_counter()
+        self.spans = []
+        self.profile_path: str = None
+        self.trace_memory = trace_memory
+        self.peak_bytes = {}
+        self._lock = threading.Lock()
+
+    def add(self, stage: str, start: float, seconds: float):
+        """
+        Record a stage that started at start (a time.perf_counter value) and
+        took seconds.
+        """
+        with self._lock:
+            self.spans.append((stage, start - self.start, seconds))
+
+    @contextmanager
+    def memory_span(self, stage: str):
+        """
+        Record the peak memory allocated by the enclosed block under stage,
+        as seen by tracemalloc (which must be tracing; Python and NumPy
+        allocations only). Spans may be nested, also across traces: the peak
+        of the enclosing span includes those of the spans inside it. The
+        peak is global to the process, so the peaks of spans that run at the
+        same time in several threads are only approximate.
+        """
+        if not self.trace_memory or not tracemalloc.is_tracing():
+            yield
+            return
+
+        # one entry [memory at start, peak carried over] per open span
+        stack = getattr(_memory_spans, "stack", None)
+        if stack is None:
+            stack = _memory_spans.stack = []
+        current, peak = tracemalloc.get_traced_memory()
+        if stack:
+            # resetting the peak below would lose the enclosing span's peak so far
+            stack[-1][1] = max(stack[-1][1], peak)
+        tracemalloc.reset_peak()
+        stack.append([current, 0])
+        try:
+            yield
+        finally:
+            start_bytes, carried_peak = stack.pop()
+            peak = max(tracemalloc.get_traced_memory()[1], carried_peak)
+            if stack:
+                stack[-1][1] = max(stack[-1][1], peak)
+            with self._lock:
+                self.peak_bytes[stage] = max(self.peak_bytes.get(stage, 0), peak - start_bytes)
+
+    def elapsed(self):
+        """
+        Return the number of seconds since the trace started.
+        """
+        return time.perf_counter() - self.start
+
+    def totals(self):
+        """
+        Add up the recorded spans by stage.
+
+        Returns
+        -------
+        out : dict[str, dict]
+            Maps each stage, in the order in which it first finished, to its
+            total duration "seconds" and its number of spans "count".
+        """
+        totals = {}
+        with self._lock:
+            for stage, _, seconds in self.spans:
+                total = totals.setdefault(stage, {"seconds": 0.0, "count": 0})
+                total["seconds"] += seconds
+                total["count"] += 1
+        return totals
+
+    def server_timing(self):
+        """
+        Format the totals of the stages and the time since the trace started
+        as the value of a Server-Timing header (durations in milliseconds).
+        """
+        metrics = [stage + ";dur=" + format(total["seconds"] * 1000, ".3f")
+                   for stage, total in self.totals().items()]
+        metrics.append("total;dur=" + format(self.elapsed() * 1000, ".3f"))
+        return ", ".join(metrics)
+
+
+def current_trace():
+    """
+    Return the Trace of the request handled in the current context, or None.
+    """
+    return _current_trace.get()
+
+
+@contextmanager
+def start_trace(trace_memory: bool = False):
+    """
+    Start a Trace for the enclosed block (e.g. one request) and make it the
+    current trace, including in tasks and threadpool calls started from it.
+    With trace_memory, the stages also record their peak memory (see
+    Trace.memory_span) while tracemalloc is tracing.
+    """
+    trace = Trace(trace_memory)
+    token = _current_trace.set(trace)
+    try:
+        yield trace
+    finally:
+        _current_trace.reset(token)
+
+
+@contextmanager
+def profiled(profile_dir: str, name: str):
+    """
+    Profile the enclosed block with cProfile and write the statistics to
+    profile_dir, in a file that can be read with pstats or snakeviz. Only the
+    calling thread is profiled, so work done in thread or process pools is
+    not included.
+
+    Parameters
+    ----------
+    profile_dir : str
+        Directory to write the profile to, created if needed.
+    name : str
+        Prefix of the file name, e.g. the name of the handler.
+    """
+    trace = current_trace()
+    trace_id = trace.trace_id if trace is not None else uuid.uuid4().hex
+    path = os.path.join(profile_dir, time.strftime("%Y%m%d-%H%M%S") + "_" + name + "_" + trace_id[:8] + ".prof")
+
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        yield path
+    finally:
+        profiler.disable()
+        os.makedirs(profile_dir, exist_ok=True)
+        profiler.dump_stats(path)
+        logger.info("wrote profile %s", path)
+        if trace is not None:
+            trace.profile_path = path
@@ -1,33 +1,178 @@
 // import causaldict from "../components/EstimationPane";
 export const BASE_URL = "http://127.0.0.1:8000";
 
+// missing values (e.g. effects that could not be computed) are null
 export interface CausalResults {
     intervention: number[],
     delta_t: number[],
-    causal_effects: number[][]
+    causal_effects: (number | null)[][],
+    standard_errors?: (number | null)[][],
+    lower?: (number | null)[][],
+    upper?: (number | null)[][],
+    n_bootstrap?: number
 }
 
-// getCausalResultsFromBackend: receive causal results in the form
-// {intervention: ..., delta_t: ..., causal_effects: ...}
+export interface CausalJobStatus {
+    status: "pending" | "running" | "done" | "failed",
+    progress: number,
+    result: CausalResults | null,
+    error: string | null
+}
+
+const POLL_INTERVAL_MS = 500;
+
+const sleep = (ms: number) => new Promise((resolve) => setTimeout(resolve, ms));
+
+// read the JSON body of a response, and throw the error detail of a failed request
+const readJSON = (response: Response) => response.json().then((json) => {
+    if (!response.ok) {
+        throw Error(json.detail ?? `request failed with status ${response.status}`);
+    }
+    return json;
+});
+
+// getCausalResultsFromBackend: start a causal effect job on the backend and poll
+// it until the results are available in the form
+// {intervention: ..., delta_t: ..., causal_effects: ...}; used when the results
+// cannot be streamed (see streamCausalResultsFromBackend)
 export const getCausalResultsFromBackend = async (
     cause_var: string,
     response_var: string,
     min_intervention: number,
     max_intervention: number,
     max_delta_t: number,
+    onProgress?: (progress: number) => void,
+    estimator?: string,
+    approximate: boolean = false,
+    bootstrap: number = 0,
 ): Promise<CausalResults> => {
-    const requestURL = `${BASE_URL}/causal_effect?cause_variable=${cause_var}&` +
-        `response_variable=${response_var}&max_delta_t=${max_delta_t}&` +
-        `min_intervention=${min_intervention}&max_intervention=${max_intervention}`;
-
-    const causal_results = await fetch(requestURL, {
-        method: "GET",
+    const job = await fetch(`${BASE_URL}/causal_effect/jobs`, {
+        method: "POST",
+        body: JSON.stringify({
+            cause_variable: cause_var,
+            response_variable: response_var,
+            min_intervention: min_intervention,
+            max_intervention: max_intervention,
+            max_delta_t: max_delta_t,
+            ...(estimator ? { estimator: estimator } : {}),
+            approximate: approximate,
+            bootstrap: bootstrap,
+        }),
+        headers: { "Content-Type": "application/json" },
     })
-        .then((response) => response.json())
-        .then((json) => json as CausalResults)
+        .then(readJSON)
+        .then((json) => json as { job_id: string })
 
-    console.log('causal_results', causal_results)
-    return causal_results;
+    const statusURL = `${BASE_URL}/causal_effect/jobs/${job.job_id}`;
+
+    while (true) {
+        const job_status = await fetch(statusURL, {
+            method: "GET",
+        })
+            .then(readJSON)
+            .then((json) => json as CausalJobStatus)
+
+        if (onProgress) {
+            onProgress(job_status.progress);
+        }
+        if (job_status.status === "done" && job_status.result) {
+            console.log('causal_results', job_status.result)
+            return job_status.result;
+        }
+        if (job_status.status === "failed") {
+            throw Error(job_status.error ?? "causal effect computation failed");
+        }
+
+        await sleep(POLL_INTERVAL_MS);
+    }
 };
 
+// streamCausalResultsFromBackend: compute causal results on the backend and
+// receive them one delta_t column at a time. onPartialResults is called with the
+// delta_t values whose columns have arrived so far (in order) and the fraction
+// of columns received; the returned promise resolves with the full results.
+// If the stream cannot be opened (no EventSource, or no connection before the
+// first event), the results are computed by a polled background job instead,
+// and onPartialResults only reports the progress.
+export const streamCausalResultsFromBackend = (
+    cause_var: string,
+    response_var: string,
+    min_intervention: number,
+    max_intervention: number,
+    max_delta_t: number,
+    onPartialResults: (partial: CausalResults, progress: number) => void,
+    estimator?: string,
+    approximate: boolean = false,
+    bootstrap: number = 0,
+): Promise<CausalResults> => new Promise((resolve, reject) => {
+    const requestURL = `${BASE_URL}/causal_effect/stream?cause_variable=${cause_var}&` +
+        `response_variable=${response_var}&max_delta_t=${max_delta_t}&` +
+        `min_intervention=${min_intervention}&max_intervention=${max_intervention}` +
+        (estimator ? `&estimator=${estimator}` : "") +
+        (approximate ? "&approximate=true" : "") +
+        (bootstrap > 0 ? `&bootstrap=${bootstrap}` : "");
+
+    const pollJob = () => getCausalResultsFromBackend(
+        cause_var, response_var, min_intervention, max_intervention, max_delta_t,
+        (progress) => onPartialResults({ intervention: [], delta_t: [], causal_effects: [] }, progress),
+        estimator, approximate, bootstrap,
+    ).then(resolve, reject);
+
+    if (typeof EventSource === "undefined") {
+        pollJob();
+        return;
+    }
+
+    const source = new EventSource(requestURL);
+    let started = false;
+    let intervention: number[] = [];
+    let delta_t: number[] = [];
+    let columns: ((number | null)[] | undefined)[] = [];
+
+    source.addEventListener("start", (event) => {
+        started = true;
+        const start = JSON.parse((event as MessageEvent).data);
+        intervention = start.intervention;
+        delta_t = start.delta_t;
+        columns = delta_t.map(() => undefined);
+    });
+
+    source.addEventListener("column", (event) => {
+        const column = JSON.parse((event as MessageEvent).data);
+        columns[column.index] = column.causal_effects;
+
+        // only show the leading columns that have all arrived
+        let n_ready = 0;
+        while (n_ready < columns.length && columns[n_ready] !== undefined) {
+            n_ready++;
+        }
+        const ready = columns.slice(0, n_ready) as (number | null)[][];
+        onPartialResults({
+            intervention: intervention,
+            delta_t: delta_t.slice(0, n_ready),
+            causal_effects: intervention.map((_, i) => ready.map((col) => col[i])),
+        }, columns.filter((col) => col !== undefined).length / columns.length);
+    });
+
+    source.addEventListener("done", (event) => {
+        source.close();
+        const causal_results = JSON.parse((event as MessageEvent).data) as CausalResults;
+        console.log('causal_results', causal_results)
+        resolve(causal_results);
+    });
+
+    source.addEventListener("error", (event) => {
+        source.close();
+        const data = (event as MessageEvent).data;
+        if (data) {
+            reject(Error(JSON.parse(data).detail));
+        } else if (!started) {
+            console.log("could not stream the causal results, polling a background job instead");
+            pollJob();
+        } else {
+            reject(Error("lost connection to the server"));
+        }
+    });
+});
+
 export default getCausalResultsFromBackend;
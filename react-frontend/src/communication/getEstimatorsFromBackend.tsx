@@ -0,0 +1,26 @@
+export const BASE_URL = "http://127.0.0.1:8000";
+
+export interface EstimatorInfo {
+    name: string;
+    description: string;
+}
+
+export interface EstimatorList {
+    default: string;
+    estimators: EstimatorInfo[];
+}
+
+// getEstimatorsFromBackend: list the regression models the backend can use
+// to compute causal effects
+export const getEstimatorsFromBackend = async (): Promise<EstimatorList> => {
+    const requestURL = `${BASE_URL}/estimators`;
+    const data = await fetch(requestURL, {
+        method: "GET",
+    })
+        .then((response) => response.json())
+        .then((d) => d as EstimatorList);
+
+    return data;
+};
+
+export default getEstimatorsFromBackend;
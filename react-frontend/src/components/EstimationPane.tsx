@@ -1,9 +1,16 @@
 // import { timeStamp } from "console";
 import React from "react";
 import {
-    getCausalResultsFromBackend,
+    streamCausalResultsFromBackend,
     CausalResults,
 } from "../communication/getCausalResultsFromBackend";
+import {
+    getEstimatorsFromBackend,
+    EstimatorInfo,
+} from "../communication/getEstimatorsFromBackend";
+
+// maximum number of bootstrap replicates requested for confidence bands
+const N_BOOTSTRAP = 200;
 // import { GoogleDataTable } from "react-google-charts";
 // import getVariablesFromBackend from "../communication/getVariablesFromBackend";
 // import { handleInputChange } from "react-select/dist/declarations/src/utils";
@@ -13,6 +20,7 @@ import {
     Text,
     Stack,
     Button,
+    Checkbox,
     Select,
     NumberInput,
     NumberInputField,
@@ -51,6 +59,12 @@ interface EstimationPaneState {
     data_version: number;
     show_graph: Boolean;
     show_progress: Boolean;
+    progress: number;
+    estimators: EstimatorInfo[];
+    estimator: string;
+    approximate: boolean;
+    shows_approximate: boolean;
+    confidence_bands: boolean;
 }
 
 class EstimationPane extends React.Component<
@@ -85,6 +99,12 @@ class EstimationPane extends React.Component<
             data_version: 0,
             show_graph: false,
             show_progress: false,
+            progress: 0,
+            estimators: [],
+            estimator: "",
+            approximate: false,
+            shows_approximate: false,
+            confidence_bands: false,
         };
         this.getCausalEstimation = this.getCausalEstimation.bind(this);
         this.getData = this.getData.bind(this);
@@ -104,26 +124,47 @@ class EstimationPane extends React.Component<
         return null;
     }
 
-    getCausalEstimation() {
-        this.setState({ show_graph: false, show_progress: true });
-        const new_data_version = this.state.data_version + 1;
+    componentDidMount() {
+        getEstimatorsFromBackend().then(
+            (v) => this.setState({ estimators: v.estimators, estimator: v.default }),
+            (r) => console.log(r)
+        );
+    }
+
+    getCausalEstimation(approximate: boolean = this.state.approximate) {
+        this.setState({ show_graph: false, show_progress: true, progress: 0 });
 
-        getCausalResultsFromBackend(
+        streamCausalResultsFromBackend(
             this.state.cause_var,
             this.state.effect_var,
             this.state.min_intervention,
             this.state.max_intervention,
-            this.state.max_time_step
+            this.state.max_time_step,
+            (partial, progress) =>
+                this.setState((state) => ({
+                    causal_dict: partial,
+                    data_version: state.data_version + 1,
+                    dosage: state.show_graph ? state.dosage : state.min_intervention,
+                    show_graph: partial.delta_t.length > 0,
+                    progress: progress,
+                })),
+            this.state.estimator,
+            approximate,
+            this.state.confidence_bands ? N_BOOTSTRAP : 0
         ).then(
             (v) =>
-                this.setState({
+                this.setState((state) => ({
                     causal_dict: v,
-                    data_version: new_data_version,
-                    dosage: this.state.min_intervention,
+                    data_version: state.data_version + 1,
+                    dosage: state.show_graph ? state.dosage : state.min_intervention,
                     show_graph: true,
-                    show_progress: false
-                }),
-            (r) => console.log(r)
+                    show_progress: false,
+                    shows_approximate: approximate,
+                })),
+            (r) => {
+                console.log(r);
+                this.setState({ show_progress: false });
+            }
         );
 
         // this.setState({ causal_effect: this.state.causal_dict['causal_effects'] })
@@ -136,9 +177,17 @@ class EstimationPane extends React.Component<
         var graph_data_header = [
             { type: "string", label: "time" },
             { type: "number", label: this.state.dosage + " µg/kg" },
-            // { id: "i0", type: "number", role: "interval" },
-            // { id: "i1", type: "number", role: "interval" },
         ];
+        const standard_errors = this.state.causal_dict["standard_errors"];
+        const lower = this.state.causal_dict["lower"];
+        const upper = this.state.causal_dict["upper"];
+        if ((lower && upper) || standard_errors) {
+            // 95% interval from the bootstrap, or approximately from the standard errors
+            graph_data_header.push(
+                { id: "i0", type: "number", role: "interval" } as any,
+                { id: "i1", type: "number", role: "interval" } as any
+            );
+        }
 
         var LineData = [];
 
@@ -156,7 +205,19 @@ class EstimationPane extends React.Component<
         var dosage_effects = this.state.causal_dict["causal_effects"][index];
         // console.log("d", dosage_effects);
         for (let i = 0; i < dosage_effects.length; i++) {
-            LineData.push([time[i]].concat(dosage_effects[i]));
+            if (lower && upper) {
+                LineData.push([time[i], dosage_effects[i], lower[index][i], upper[index][i]]);
+            } else if (standard_errors) {
+                const effect = dosage_effects[i];
+                const error = standard_errors[index][i];
+                // missing effects or standard errors are null, and so is their interval
+                const interval = effect === null || error === null
+                    ? [null, null]
+                    : [effect - 1.96 * error, effect + 1.96 * error];
+                LineData.push([time[i], effect, ...interval]);
+            } else {
+                LineData.push([time[i], dosage_effects[i]]);
+            }
             // console.log(LineData);
         }
         // console.log(LineData);
@@ -214,6 +275,27 @@ class EstimationPane extends React.Component<
                                 </option>
                             ))}
                         </Select>
+
+                        <Text> Model: </Text>
+                        <Select
+                            size="sm"
+                            width={"220px"}
+                            name="estimator"
+                            value={this.state.estimator}
+                            onChange={(e) =>
+                                this.setState({ estimator: e.target.value })
+                            }
+                        >
+                            {this.state.estimators.map((estimator) => (
+                                <option
+                                    key={estimator.name}
+                                    value={estimator.name}
+                                    title={estimator.description}
+                                >
+                                    {estimator.name}
+                                </option>
+                            ))}
+                        </Select>
                     </Stack>
 
                     <Stack
@@ -292,10 +374,39 @@ class EstimationPane extends React.Component<
                             Compute Causal Effect
                         </Button>
 
+                        <Checkbox
+                            isChecked={this.state.approximate}
+                            onChange={(e) =>
+                                this.setState({ approximate: e.target.checked })
+                            }
+                        >
+                            Quick estimate (sample of patients)
+                        </Checkbox>
+
+                        <Checkbox
+                            isChecked={this.state.confidence_bands}
+                            onChange={(e) =>
+                                this.setState({ confidence_bands: e.target.checked })
+                            }
+                        >
+                            Confidence bands (bootstrap)
+                        </Checkbox>
+
+                        {this.state.shows_approximate && !this.state.show_progress && (
+                            <Button
+                                margin={"10px"}
+                                size="md"
+                                variant={"outline"}
+                                onClick={() => this.getCausalEstimation(false)}
+                            >
+                                Refine on all patients
+                            </Button>
+                        )}
+
 
                         {this.state.show_progress &&
                             (
-                                <><CircularProgress size='25px' isIndeterminate /><Text as={"em"}> Please be patient... It can take up to a minute to compute the causal effect.</Text></>)
+                                <><CircularProgress size='25px' value={100 * this.state.progress} /><Text as={"em"}> Please be patient... {Math.round(100 * this.state.progress)}% of the causal effects computed, the plot fills in as results arrive.</Text></>)
 
                         }
 
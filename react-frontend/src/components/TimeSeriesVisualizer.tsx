@@ -75,6 +75,7 @@ class TimeSeriesVisualizer extends React.Component<
                             series: {
                                 1: { curveType: "function" },
                             },
+                            intervals: { style: "area" },
 
                             legend: {
                                 position: "right",